@@ -0,0 +1,94 @@
+# bench_parsers.py
+# Time table_parser against the BeautifulSoup code it replaced, on archived pages.
+#
+#   python bench_parsers.py                    # every archived formula1.com results page
+#   python bench_parsers.py --like '%/race-result' --limit 200 --repeat 3
+#
+# Both paths run on the same decoded HTML (no network, no DB). The "p-table"
+# pass is the first-<p>-per-cell walk of results.py / starting_grid.py /
+# fastest_laps.py / team_results.py, the "text-table" pass the full-text
+# walk of f1_results_scraper.py / races.py. Outputs are compared row by row,
+# so the benchmark doubles as a regression check after layout changes.
+import argparse
+import time
+
+from bs4 import BeautifulSoup
+
+import page_archive
+import table_parser
+
+
+# --- the BeautifulSoup paths as they were ---
+def bs_p_table(html):
+    table = BeautifulSoup(html, "lxml").find("main").find("table")
+    headers = [th.find("p").get_text() for th in table.find_all("th")]
+    rows = [[td.find("p").get_text() for td in tr.find_all("td")] for tr in table.find_all("tr")]
+    return headers, [r for r in rows if r]
+
+
+def bs_text_table(html):
+    table = BeautifulSoup(html, "lxml").find("main").find("table")
+    headers = [table_parser.normalize_space(th.get_text()) for th in table.select("thead th")]
+    rows = [[table_parser.normalize_space(td.get_text()) for td in tr.select("td")] for tr in table.select("tbody tr")]
+    return headers, rows
+
+
+def lxml_text_table(html):
+    return table_parser.text_table(table_parser.tables(table_parser.parse_main(html))[0])
+
+
+PASSES = {
+    "p-table": (bs_p_table, table_parser.p_table),
+    "text-table": (bs_text_table, lxml_text_table),
+}
+
+
+def load_pages(like, limit=None):
+    pages = []
+    for url, sha, _ in page_archive.iter_latest(like):
+        html = page_archive.load(sha).decode("utf-8", errors="replace")
+        if "<table" in html:
+            pages.append((url, html))
+        if limit and len(pages) >= limit:
+            break
+    return pages
+
+
+def timed(fn, pages, repeat):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [_safe(fn, html) for _, html in pages]
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def _safe(fn, html):
+    try:
+        return fn(html)
+    except (AttributeError, IndexError):     # page without a (p-)table
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BeautifulSoup vs table_parser on archived pages.")
+    parser.add_argument("--like", default="https://www.formula1.com/en/results/%",
+                        help="SQL LIKE pattern over archived URLs.")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--repeat", type=int, default=1, help="Best of N runs.")
+    args = parser.parse_args()
+
+    pages = load_pages(args.like, args.limit)
+    if not pages:
+        raise SystemExit(f"No archived pages match {args.like!r}; run a scraper (online) first.")
+    mb = sum(len(h) for _, h in pages) / 1e6
+    print(f"{len(pages)} pages, {mb:.1f} MB of HTML")
+
+    for name, (old, new) in PASSES.items():
+        t_old, out_old = timed(old, pages, args.repeat)
+        t_new, out_new = timed(new, pages, args.repeat)
+        diffs = [url for (url, _), a, b in zip(pages, out_old, out_new) if a != b]
+        print(f"{name:>10}: BeautifulSoup {t_old:7.2f}s   table_parser {t_new:7.2f}s   "
+              f"x{t_old / max(t_new, 1e-9):5.1f}   {len(diffs)} page(s) differ")
+        for url in diffs[:5]:
+            print(f"            differs: {url}")
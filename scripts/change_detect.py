@@ -0,0 +1,68 @@
+# change_detect.py
+# Content fingerprints for source pages, so re-runs skip what hasn't changed.
+#
+# Every successfully written page gets a sha256 fingerprint of its content in
+# page_fingerprints. On the next run a page whose fingerprint matches is not
+# parsed or written at all. Row-level skipping (IS DISTINCT FROM guards on
+# the upsert) lives in pg_bulk.copy_upsert.
+#
+# page_fingerprint hashes only a page's <main> block. Scrapers that also read
+# fields from outside it fingerprint their parsed rows with rows_fingerprint
+# instead, so a change in those fields is not mistaken for an unchanged page.
+import hashlib
+import re
+
+from storage import ddl, execute_values
+
+# formula1.com pages embed per-request build ids / nonces outside <main>;
+# only the main content decides whether the data changed.
+_MAIN = re.compile(r"<main\b.*?</main>", re.S | re.I)
+
+
+def page_fingerprint(html: str) -> str:
+    m = _MAIN.search(html or "")
+    content = m.group(0) if m else (html or "")
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def rows_fingerprint(*parts) -> str:
+    """sha256 of parsed output (tuples/lists of plain values), for pages read beyond <main>."""
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+def ensure_fingerprint_table(cur):
+    ddl(cur, """
+        CREATE TABLE IF NOT EXISTS page_fingerprints (
+            url         TEXT PRIMARY KEY,
+            sha256      TEXT NOT NULL,
+            written_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+
+
+def load_fingerprints(cur, urls):
+    """{url: sha256} for the urls that were written before."""
+    urls = list(urls)
+    if not urls:
+        return {}
+    found = {}
+    for i in range(0, len(urls), 500):   # IN (...) instead of = ANY(array): portable to SQLite
+        chunk = urls[i:i + 500]
+        cur.execute(f"SELECT url, sha256 FROM page_fingerprints WHERE url IN ({', '.join(['%s'] * len(chunk))})",
+                    chunk)
+        found.update(cur.fetchall())
+    return found
+
+
+def record_fingerprints(cur, fingerprints):
+    """Store {url: sha256} for pages whose rows were just written."""
+    if not fingerprints:
+        return
+    sql = """
+        INSERT INTO page_fingerprints (url, sha256)
+        VALUES %s
+        ON CONFLICT (url) DO UPDATE
+        SET sha256     = EXCLUDED.sha256,
+            written_at = now();
+    """
+    execute_values(cur, sql, list(fingerprints.items()))
@@ -0,0 +1,71 @@
+# checkpoint.py
+# Durable local journal of finished work units, so long backfills can resume.
+#
+# Every entry point records (source, year, unit) once a unit's rows are
+# committed -- a race round, an OpenF1 session_key, a race link. A whole year
+# is closed with the YEAR unit once all of its units went through, so a
+# --resume run skips finished years without even fetching their index. The
+# journal lives in data/checkpoints.sqlite next to the page archive and
+# survives crashes and Ctrl-C (every mark is committed immediately).
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "checkpoints.sqlite")
+YEAR = "*"     # unit that marks a whole year as done
+
+_lock = threading.Lock()
+_db = None
+
+
+def _journal():
+    global _db
+    if _db is None:
+        os.makedirs(os.path.dirname(JOURNAL_PATH), exist_ok=True)
+        _db = sqlite3.connect(JOURNAL_PATH, check_same_thread=False)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute("""
+            CREATE TABLE IF NOT EXISTS done (
+                source   TEXT NOT NULL,
+                year     INTEGER NOT NULL,
+                unit     TEXT NOT NULL,
+                done_at  TEXT NOT NULL,
+                PRIMARY KEY (source, year, unit)
+            )""")
+        _db.commit()
+    return _db
+
+
+def mark_done(source, year, *units):
+    """Record finished units (use checkpoint.YEAR to close a whole year)."""
+    if not units:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    with _lock:
+        db = _journal()
+        db.executemany("INSERT OR REPLACE INTO done VALUES (?, ?, ?, ?)",
+                       [(source, year, str(u), now) for u in units])
+        db.commit()
+
+
+def done_units(source, year):
+    """Set of unit names already finished for (source, year)."""
+    with _lock:
+        rows = _journal().execute("SELECT unit FROM done WHERE source = ? AND year = ?", (source, year)).fetchall()
+    return {u for (u,) in rows}
+
+
+def year_done(source, year):
+    return YEAR in done_units(source, year)
+
+
+def reset(source, years=None):
+    """Forget progress for `source` (optionally only the given years)."""
+    with _lock:
+        db = _journal()
+        if years is None:
+            db.execute("DELETE FROM done WHERE source = ?", (source,))
+        else:
+            db.executemany("DELETE FROM done WHERE source = ? AND year = ?", [(source, y) for y in years])
+        db.commit()
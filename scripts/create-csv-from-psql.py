@@ -1,16 +1,299 @@
-import pandas as pd
+# create-csv-from-psql.py
+# Export analytics tables from the f1-analytics Postgres instance to CSV or Parquet.
+#
+# CSV: each table is streamed with COPY ... TO STDOUT straight into its file
+# (in 8 KiB chunks), so memory stays flat no matter how large lap_times grows.
+# Files are written to a temp name and renamed when complete; optionally
+# gzip-compressed, and several tables can be exported in parallel (one
+# connection each).
+#
+# Parquet (--format parquet, needs pyarrow): typed, zstd-compressed files in a
+# hive layout partitioned by season and race,
+#   data/parquet/<table>/year=2021/race_id=1056/part-0.parquet
+# so pandas / Power BI can load one season's laps without scanning the rest.
+# The exported tables are the Ergast-shaped ones (race_id, driver_id, ...);
+# the year is joined in from the races table (RACES_TABLE); rows are read through a server-side
+# cursor in CHUNK_ROWS batches, sorted by each table's key so row-group
+# min/max statistics prune well.
+#
+# Incremental (--incremental, Parquet only): exported tables carry a
+# modified_at column kept current by an UPDATE trigger, added once with
+# --setup-change-tracking (the trigger ignores updates that leave the row as
+# it was, so reloading a finished race does not mark it changed). modified_at
+# is bookkeeping and is left out of both CSV and Parquet output.
+# Each export records a watermark per table in <out-dir>/_export_state.json
+# and the next one rewrites only the races with rows modified since then --
+# after a race weekend that is a handful of partitions, not the whole history.
+# Rows are stamped with clock_timestamp() (when the row is written, not when
+# its transaction began), and the watermark is the start of the oldest write
+# transaction still open when the export begins (or the export's own start), so
+# rows a long load (--commit-every year) commits after an export are stamped at
+# or after that export's watermark and picked up by the next one. Seeing other
+# roles' open transactions needs pg_read_all_stats (or the writers' role).
+# Rows deleted from Postgres are not tracked; run a full export to drop them.
+#
+# Postgres only: unlike the scrapers this does not go through storage.conn, so
+# F1_STORAGE does not apply. It reads the separate f1-analytics instance
+# (F1_EXPORT_DB_* below, not db.py's F1_DB_* scraper database) and relies on
+# COPY ... TO STDOUT, server-side cursors, column type OIDs, triggers and
+# pg_stat_activity, none of which the SQLite backend has. A local SQLite file
+# is already a portable copy; export from it with sqlite3 or pandas directly.
+import argparse
+import gzip
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
 import psycopg2
 
-conn = psycopg2.connect(
-    host="f1-analytics-db-instance-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com",
-    port=5432,
-    user="f1admin",
-    password="formula1.1832",
-    dbname="postgres"
-)
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:       # optional: only needed for --format parquet
+    pa = ds = None
+
+# --- WARNING: Storing credentials in code is insecure. ---
+# Prefer the F1_EXPORT_DB_* environment variables; the defaults are the original settings.
+DB_HOST = os.environ.get("F1_EXPORT_DB_HOST", "f1-analytics-db-instance-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com")
+DB_PORT = int(os.environ.get("F1_EXPORT_DB_PORT", 5432))
+DB_USER = os.environ.get("F1_EXPORT_DB_USER", "f1admin")
+DB_PASSWORD = os.environ.get("F1_EXPORT_DB_PASSWORD", "formula1.1832")
+DB_NAME = os.environ.get("F1_EXPORT_DB_NAME", "postgres")
+
+TABLES = ["results", "lap_times"]
+OUT_DIR = "data"
+PARQUET_DIR = os.path.join(OUT_DIR, "parquet")
+
+CHUNK_ROWS = 50_000            # rows per server-side fetch / record batch
+ROW_GROUP_ROWS = 128 * 1024
+# row order inside each partition (drives row-group statistics)
+SORT_KEYS = {"lap_times": ("driver_id", "lap_number"), "results": ("position_order",)}
+RACES_TABLE = "races"          # race_id -> year
+
+TRACKING_COLUMN = "modified_at"
+STATE_FILE = "_export_state.json"
+# watermark: start of the oldest transaction (in this database) that has written
+# and not committed yet, or now() if there is none
+WATERMARK_SQL = """
+    SELECT LEAST(now(), min(xact_start)) FROM pg_stat_activity
+    WHERE datname = current_database() AND backend_xid IS NOT NULL AND pid <> pg_backend_pid()
+"""
+
+_state_lock = threading.Lock()
+
+
+def connect():
+    return psycopg2.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, dbname=DB_NAME)
+
+
+def export_columns(cur, table):
+    """Quoted column list of `table` without the change-tracking column."""
+    cur.execute("SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = %s AND column_name <> %s "
+                "ORDER BY ordinal_position", (table, TRACKING_COLUMN))
+    return [f'"{c}"' for (c,) in cur.fetchall()]
+
+
+def export_csv(table, out_dir=OUT_DIR, compress=False):
+    """Stream `table` into <out_dir>/<table>.csv[.gz]; returns the file path."""
+    path = os.path.join(out_dir, f"{table}.csv" + (".gz" if compress else ""))
+    tmp = f"{path}.tmp"
+    opener = gzip.open if compress else open
+    conn = connect()
+    try:
+        with conn.cursor() as cur, opener(tmp, "wt", encoding="utf-8", newline="") as f:
+            cols = ", ".join(export_columns(cur, table))
+            cur.copy_expert(f'COPY (SELECT {cols} FROM "{table}") TO STDOUT WITH (FORMAT csv, HEADER)', f)
+        os.replace(tmp, path)
+    finally:
+        conn.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    print(f"{table} -> {path}")
+    return path
+
+
+def _arrow_type(type_code):
+    """Arrow type for a Postgres column type OID (text for anything unlisted)."""
+    return {
+        16: pa.bool_(), 20: pa.int64(), 21: pa.int16(), 23: pa.int32(),
+        700: pa.float32(), 701: pa.float64(), 1700: pa.float64(),
+        1082: pa.date32(), 1114: pa.timestamp("us"), 1184: pa.timestamp("us", tz="UTC"),
+    }.get(type_code, pa.string())
+
+
+def _batch(rows, schema):
+    columns = []
+    for values, field in zip(zip(*rows), schema):
+        if field.type == pa.float64():
+            values = [float(v) if isinstance(v, Decimal) else v for v in values]   # NUMERIC
+        columns.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def _has_trigger(cur, table):
+    cur.execute("SELECT 1 FROM pg_trigger WHERE tgname = %s", (f"{table}_touch_modified_at",))
+    return cur.fetchone() is not None
+
+
+def has_change_tracking(cur, table):
+    """Trigger installed and inserts stamped with clock_timestamp() (setups older than that need a re-run)."""
+    if not _has_trigger(cur, table):
+        return False
+    cur.execute("SELECT column_default FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s",
+                (table, TRACKING_COLUMN))
+    row = cur.fetchone()
+    return row is not None and row[0] == "clock_timestamp()"
+
+
+def setup_change_tracking(cur, table):
+    """
+    Give `table` a modified_at column that every INSERT/UPDATE stamps with
+    clock_timestamp() (one-off, idempotent; re-running it upgrades older setups).
+    """
+    # now() as the column default fills existing rows without a table rewrite
+    cur.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS modified_at TIMESTAMPTZ NOT NULL DEFAULT now()')
+    cur.execute(f'ALTER TABLE "{table}" ALTER COLUMN modified_at SET DEFAULT clock_timestamp()')
+    cur.execute(f'CREATE INDEX IF NOT EXISTS "{table}_modified_at" ON "{table}" (modified_at)')
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION touch_modified_at() RETURNS trigger AS $$
+        BEGIN
+            IF NEW IS DISTINCT FROM OLD THEN      -- no-op upserts keep their stamp
+                NEW.modified_at := clock_timestamp();
+            END IF;
+            RETURN NEW;
+        END $$ LANGUAGE plpgsql
+    """)
+    if not _has_trigger(cur, table):
+        cur.execute(f'CREATE TRIGGER "{table}_touch_modified_at" BEFORE UPDATE ON "{table}" '
+                    f'FOR EACH ROW EXECUTE FUNCTION touch_modified_at()')
+
+
+def load_state(out_dir):
+    """{table: ISO watermark} recorded by previous exports into `out_dir`."""
+    try:
+        with open(os.path.join(out_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_watermark(out_dir, table, watermark):
+    with _state_lock:
+        os.makedirs(out_dir, exist_ok=True)
+        state = load_state(out_dir)
+        state[table] = watermark.isoformat()
+        path = os.path.join(out_dir, STATE_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(f"{path}.tmp", path)
+
+
+def export_parquet(table, out_dir=PARQUET_DIR, chunk_rows=CHUNK_ROWS, since=None):
+    """
+    Write `table` as Parquet partitioned by year / race_id under <out_dir>/<table>/
+    and record the export's watermark. With `since` (an earlier watermark) only
+    the races with rows modified after it are rewritten.
+    """
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    base = os.path.join(out_dir, table)
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cols = ", ".join(f"t.{c}" for c in export_columns(cur, table))
+            cur.execute(WATERMARK_SQL)                    # see the header: no write can land behind it
+            watermark = cur.fetchone()[0]
+            where, params = "", ()
+            if since is not None:
+                if not has_change_tracking(cur, table):
+                    raise RuntimeError(f"{table} has no (current) change tracking; run with --setup-change-tracking")
+                cur.execute(f'SELECT DISTINCT race_id FROM "{table}" '
+                            f'WHERE {TRACKING_COLUMN} >= %s::timestamptz', (since,))
+                race_ids = [r for (r,) in cur.fetchall()]
+                if not race_ids:
+                    save_watermark(out_dir, table, watermark)
+                    print(f"{table}: unchanged since {since}")
+                    return base
+                where, params = "WHERE t.race_id = ANY(%s) ", (race_ids,)
+
+        with conn.cursor(name=f"export_{table}") as cur:      # server-side: rows arrive in chunks
+            cur.itersize = chunk_rows
+            order = ", ".join(("r.year", "t.race_id") + tuple(f"t.{c}" for c in SORT_KEYS.get(table, ())))
+            cur.execute(f'SELECT {cols}, r.year FROM "{table}" t JOIN "{RACES_TABLE}" r ON r.race_id = t.race_id '
+                        f'{where}ORDER BY {order}', params)
+            first = cur.fetchmany(chunk_rows)
+            if not first:
+                save_watermark(out_dir, table, watermark)
+                print(f"{table}: no rows")
+                return base
+            schema = pa.schema([(c.name, _arrow_type(c.type_code)) for c in cur.description])
+
+            def batches():
+                rows = first
+                while rows:
+                    yield _batch(rows, schema)
+                    rows = cur.fetchmany(chunk_rows)
+
+            ds.write_dataset(
+                batches(), base, schema=schema, format="parquet",
+                partitioning=ds.partitioning(schema=pa.schema([schema.field("year"), schema.field("race_id")]),
+                                             flavor="hive"),
+                file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+                max_rows_per_group=ROW_GROUP_ROWS,
+                existing_data_behavior="delete_matching",   # rewritten races replace their old files
+            )
+    finally:
+        conn.close()
+    save_watermark(out_dir, table, watermark)
+    print(f"{table} -> {base}/" + (f" ({len(params[0])} race(s) changed)" if params else ""))
+    return base
+
+
+def setup_all(tables=TABLES):
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            for table in tables:
+                setup_change_tracking(cur, table)
+                print(f"{table}: change tracking on")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def export_all(tables=TABLES, out_dir=None, compress=False, jobs=1, fmt="csv", incremental=False):
+    if fmt == "parquet":
+        out_dir = out_dir or PARQUET_DIR
+        state = load_state(out_dir) if incremental else {}
+        export = lambda t: export_parquet(t, out_dir, since=state.get(t))
+    else:
+        out_dir = out_dir or OUT_DIR
+        export = lambda t: export_csv(t, out_dir, compress)
+    os.makedirs(out_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        return list(pool.map(export, tables))
 
-for table in ["results", "lap_times"]:
-    df = pd.read_sql(f"SELECT * FROM {table}", conn)
-    df.to_csv(f"data/{table}.csv", index=False)
 
-conn.close()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream Postgres tables to CSV (COPY) or partitioned Parquet.")
+    parser.add_argument("tables", nargs="*", default=TABLES)
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--out-dir", help=f"Default: {OUT_DIR} (csv) / {PARQUET_DIR} (parquet).")
+    parser.add_argument("--gzip", action="store_true", help="Write <table>.csv.gz instead of plain CSV.")
+    parser.add_argument("--jobs", type=int, default=1, help="Tables exported in parallel.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Parquet only: rewrite just the races changed since the last export.")
+    parser.add_argument("--setup-change-tracking", action="store_true",
+                        help="One-off: add modified_at + trigger to the tables (needed for --incremental), then exit.")
+    args = parser.parse_args()
+    if args.setup_change_tracking:
+        setup_all(args.tables)
+        raise SystemExit(0)
+    if args.incremental and args.format != "parquet":
+        parser.error("--incremental needs --format parquet")
+    export_all(args.tables, args.out_dir, compress=args.gzip, jobs=args.jobs, fmt=args.format,
+               incremental=args.incremental)
@@ -0,0 +1,169 @@
+# db.py
+# Shared, lazily created Postgres connection pool for every scraper/loader.
+#
+# `with conn() as connection:` borrows a warm connection instead of opening a
+# new SSL session to RDS each time; on exit the work is committed (or rolled
+# back on error) and the connection goes back to the pool. Connections that
+# sat idle for a while are pinged before reuse and replaced if dead.
+# Settings can be overridden with F1_DB_* environment variables.
+#
+# Long loads write one race at a time inside `savepoint(cur)`, so a bad race
+# only rolls back itself, and commit through a `Committer` so the transaction
+# policy (per race / every N races / per year) is a command-line choice.
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+# --- WARNING: Storing credentials in code is insecure. ---
+# Prefer the F1_DB_* environment variables; the defaults are the original RDS settings.
+DB_HOST = os.environ.get("F1_DB_HOST", "database-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com")
+DB_NAME = os.environ.get("F1_DB_NAME", "postgres")
+DB_USER = os.environ.get("F1_DB_USER", "postgres")
+DB_PASSWORD = os.environ.get("F1_DB_PASSWORD", "OnePieceReal.7143")
+DB_PORT = int(os.environ.get("F1_DB_PORT", 5432))
+DB_SSLMODE = os.environ.get("F1_DB_SSLMODE", "require")
+
+POOL_SIZE = int(os.environ.get("F1_DB_POOL_SIZE", 4))
+HEALTH_CHECK_IDLE = 30.0   # seconds idle before a connection is pinged on checkout
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None          # blocks borrowers instead of raising PoolError when all are in use
+_last_used = {}        # id(connection) -> time it was returned
+
+
+def pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(
+                0, POOL_SIZE,
+                host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
+                port=DB_PORT, sslmode=DB_SSLMODE,
+            )
+            _slots = threading.BoundedSemaphore(POOL_SIZE)
+            atexit.register(close_pool)
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def _healthy(connection):
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cur:
+            cur.execute("SELECT 1")
+        connection.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout(p):
+    connection = p.getconn()
+    idle = time.monotonic() - _last_used.get(id(connection), time.monotonic())
+    if idle > HEALTH_CHECK_IDLE and not _healthy(connection):
+        p.putconn(connection, close=True)
+        connection = p.getconn()
+    return connection
+
+
+@contextmanager
+def conn():
+    """Borrow a pooled connection; commit on success, roll back on error, always return it."""
+    p = pool()
+    _slots.acquire()
+    connection = None
+    try:
+        connection = _checkout(p)
+        yield connection
+        connection.commit()
+    except Exception:
+        if connection is not None and not connection.closed:
+            connection.rollback()
+        raise
+    finally:
+        if connection is not None:
+            _last_used[id(connection)] = time.monotonic()
+            p.putconn(connection, close=bool(connection.closed))
+        _slots.release()
+
+
+# --- transaction granularity ---
+COMMIT_CHOICES = "race | <N> | year"
+
+
+def commit_every(value):
+    """Parse a --commit-every value: 'race' -> 1, 'year' -> 0 (commit once at the end), 'N' -> N."""
+    value = str(value).strip().lower()
+    if value == "race":
+        return 1
+    if value == "year":
+        return 0
+    n = int(value)
+    if n < 0:
+        raise ValueError(f"commit granularity must be >= 0, got {n}")
+    return n
+
+
+@contextmanager
+def savepoint(cur, name="unit"):
+    """Run the block inside SAVEPOINT `name`; on error only the block is rolled back (and re-raised)."""
+    cur.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except Exception:
+        cur.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        raise
+    cur.execute(f"RELEASE SAVEPOINT {name}")
+
+
+class Committer:
+    """
+    Commits `connection` after every `every` finished units (0 = only on flush()).
+    on_commit(units) is called with the units each commit made durable, e.g. to
+    journal them (see checkpoint.py).
+
+    Writers that write several units per statement keep transactions at `every`
+    units by writing at most batch_size(n) units at a time and calling
+    make_room(n) before each write.
+    """
+
+    def __init__(self, connection, every=0, on_commit=None):
+        self.connection = connection
+        self.every = every
+        self.on_commit = on_commit
+        self.pending = []
+
+    def batch_size(self, n):
+        """Units per write batch: `n`, capped at `every` when committing every N."""
+        return min(n, self.every) if self.every > 0 else n
+
+    def make_room(self, n):
+        """Commit what is pending first if writing `n` more units would pass `every`."""
+        if self.every and self.pending and len(self.pending) + n > self.every:
+            self.flush()
+
+    def done(self, *units):
+        self.pending.extend(units)
+        if self.every and len(self.pending) >= self.every:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.connection.commit()
+            if self.on_commit:
+                self.on_commit(self.pending)
+            self.pending = []
@@ -1,78 +1,41 @@
 # f1_results_scraper.py
-import time
-import random
 import re
 import unicodedata
-import requests
-import requests_cache
-from bs4 import BeautifulSoup
-import psycopg2
-from psycopg2.extras import execute_values
+import http_client
+import checkpoint
+from http_cache import live_seasons
+import table_parser
+from lxml import etree
+from db import savepoint, Committer, commit_every
+from storage import conn, upsert, Error as DBError
+from pg_bulk import report_stats
+from change_detect import ensure_fingerprint_table, load_fingerprints, record_fingerprints, rows_fingerprint
 import pandas as pd
 from urllib.parse import urljoin
+from fetch_engine import fetch_all, RateBudget, DEFAULT_CONCURRENCY, DEFAULT_RATE
+from pipeline import run_pipeline
 
 
-# --- WARNING: Storing credentials in code is insecure. ---
-# It is highly recommended to use environment variables or a secrets management system.
-DB_HOST = "database-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com"
-DB_NAME = "postgres"
-DB_USER = "postgres"
-DB_PASSWORD = "OnePieceReal.7143"
-DB_SSLMODE = "require"
-
 BASE = "https://www.formula1.com"
+JOURNAL = "f1_results"   # checkpoint source name; units are round numbers
 
-# --- polite client: caching + rate-limit ---
-requests_cache.install_cache("f1_cache", expire_after=24*3600)  # 24h
-SESSION = requests.Session()
-SESSION.headers.update({
-    "User-Agent": "F1ApexAnalyst/1.0 (academic/personal project; contact: you@example.com)"
-})
-# REQUEST_DELAY = 1.0  # seconds between requests
-
-
+# --- polite client: shared pooled session (cache + per-host pacing) from http_client ---
 def get(url):
-    """GET with cache + delay when not cached."""
-    resp = SESSION.get(url, timeout=30)
-    REQUEST_DELAY = random.randint(5,15)
-    if not getattr(resp, "from_cache", False):
-        time.sleep(REQUEST_DELAY)
-    resp.raise_for_status()
-    return resp
+    """GET with cache; non-cached requests are paced per host by rate_control."""
+    return http_client.get(url)
 
 # --- DB helpers ---
-def conn():
-    return psycopg2.connect(
-        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
-        port=5432, sslmode=DB_SSLMODE
-    )
-
-def upsert_legacy_race(cur, year:int, round_:int, grand_prix:str, country:str, date_iso:str):
-    sql = """
-        INSERT INTO legacy_races (year, round, grand_prix, country, date)
-        VALUES %s
-        ON CONFLICT (year, round) DO UPDATE
-        SET grand_prix = EXCLUDED.grand_prix,
-            country   = EXCLUDED.country,
-            date      = EXCLUDED.date;
-    """
-    execute_values(cur, sql, [(year, round_, grand_prix, country, date_iso)])
+# COPY + merge (pg_bulk); rows identical to the stored ones are left untouched.
+RACE_COLUMNS = ("year", "round", "grand_prix", "country", "date")
+RESULT_COLUMNS = ("year", "round", "position", "driver_name", "driver_code",
+                  "constructor", "points", "status", "time_text", "laps")
+
+def upsert_legacy_races(cur, rows):
+    return upsert(cur, "legacy_races", RACE_COLUMNS, rows, conflict=("year", "round"))
 
 def upsert_legacy_results(cur, rows):
-    sql = """
-        INSERT INTO legacy_results
-        (year, round, position, driver_name, driver_code, constructor, points, status, time_text, laps)
-        VALUES %s
-        ON CONFLICT (year, round, position) DO UPDATE
-        SET driver_name = EXCLUDED.driver_name,
-            driver_code = EXCLUDED.driver_code,
-            constructor = EXCLUDED.constructor,
-            points      = EXCLUDED.points,
-            status      = EXCLUDED.status,
-            time_text   = EXCLUDED.time_text,
-            laps        = EXCLUDED.laps;
-    """
-    execute_values(cur, sql, rows)
+    return upsert(cur, "legacy_results", RESULT_COLUMNS, rows,
+                       conflict=("year", "round", "position"))
 
 # --- parsing utils ---
 def normalize_space(s):
@@ -90,61 +53,54 @@ def extract_driver_code(name):
     return m.group(1) if m else None
 
 def parse_results_table(table):
-    headers = [normalize_space(th.get_text()) for th in table.select("thead th")]
-    body = []
-    for tr in table.select("tbody tr"):
-        cells = [normalize_space(td.get_text()) for td in tr.select("td")]
-        if len(cells) < 5:
-            continue
-        row = dict(zip(headers, cells))
-        body.append(row)
-    return body
+    headers, rows = table_parser.text_table(table)
+    return [dict(zip(headers, cells)) for cells in rows if len(cells) >= 5]
 
-def parse_year_index(year: int):
-    candidates = [
+def year_index_urls(year: int):
+    return [
         f"{BASE}/en/results/{year}/races",
         f"{BASE}/en/results.html/{year}/races.html",
     ]
-    html = None
-    base_url = None
-    for u in candidates:
-        try:
-            html = get(u).text
-            base_url = u
-            break
-        except Exception:
-            continue
+
+def fetch_year_indexes(years, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE):
+    """Fetch the season index pages for `years` in parallel -> {year: html}."""
+    urls = {y: year_index_urls(y)[0] for y in years}
+    pages = fetch_all(urls.values(), get, concurrency=concurrency, rate=rate,
+                      is_cached=http_client.is_cached)
+    return {y: pages[u].text for y, u in urls.items() if not isinstance(pages[u], Exception)}
+
+def parse_year_index(year: int, html: str | None = None):
+    # html may come prefetched from fetch_year_indexes; otherwise walk the candidates
+    if html is None:
+        for u in year_index_urls(year):
+            try:
+                html = get(u).text
+                break
+            except Exception:
+                continue
     if html is None:
         raise RuntimeError(f"Could not fetch year index for {year}")
 
-    soup = BeautifulSoup(html, "lxml")
-
-    table = None
-    for t in soup.select("table"):
-        heads = [h.get_text(" ", strip=True).lower() for h in t.select("thead th")]
-        if any("grand prix" in h for h in heads) and any("date" in h for h in heads):
-            table = t
-            break
+    table = table_parser.find_table(html, lambda heads: any("grand prix" in h for h in heads)
+                                                        and any("date" in h for h in heads))
     if table is None:
         raise RuntimeError("No results table with Grand Prix + Date headers found")
 
-    headers = [h.get_text(" ", strip=True) for h in table.select("thead th")]
-    lower = [h.lower() for h in headers]
+    lower = table_parser.headers(table)
     date_idx = next(i for i, h in enumerate(lower) if "date" in h)
 
     rows = []
     rnd = 0
-    for tr in table.select("tbody tr"):
-        tds = tr.find_all("td")
+    for tr in table_parser.body_rows(table):
+        tds = table_parser.cells(tr)
         if len(tds) <= date_idx:
             continue
 
-        date_text = tds[date_idx].get_text(" ", strip=True)
+        date_text = table_parser.spaced_text(tds[date_idx])
 
-        ahref = tr.select_one('a[href*="race-result"]') or tr.select_one("a[href]")
-        if not ahref:
+        href = table_parser.first_link(tr, contains="race-result")
+        if not href:
             continue
-        href = ahref.get("href")
         if not href.endswith("/race-result"):
             href = href.rstrip("/") + "/race-result"
         result_url = urljoin(BASE, href)
@@ -171,21 +127,30 @@ def parse_date_to_iso(text:str, default_year:int|None=None):
                 pass
     return None
 
-def parse_race_result_page(url):
+# race page meta, as compiled XPath (CSS: h1, header, "nav a, .breadcrumb a, .f1-breadcrumb a", p.<class>)
+_H1 = etree.XPath("(//h1)[1]")
+_HEADER = etree.XPath("(//header)[1]")
+_CRUMBS = etree.XPath(f"//nav//a | //*[{table_parser.has_class('breadcrumb')}]//a"
+                      f" | //*[{table_parser.has_class('f1-breadcrumb')}]//a")
+
+def parse_race_result_page(url, html=None):
     """
     Return tuple: (meta, results_rows)
     meta: {grand_prix, country, date, circuit}
     results_rows: list of dicts with keys we’ll map later
+    html: page body if already fetched (e.g. by the fetch engine)
     """
-    resp = get(url)
-    soup = BeautifulSoup(resp.text, "lxml")
+    if html is None:
+        html = get(url).text
+    root = table_parser.parse(html)     # meta lives outside <main>, so this page is parsed whole
 
     # Meta extraction (best-effort; site changes layout occasionally)
-    h1 = soup.select_one("h1") or soup.select_one("header h1")
-    grand_prix = normalize_space(h1.get_text()) if h1 else None
+    h1 = _H1(root)
+    grand_prix = normalize_space(table_parser.text(h1[0])) if h1 else None
 
     # Try to find date/country in header blocks
-    header_txt = normalize_space((soup.select_one("header") or soup).get_text())
+    header = _HEADER(root)
+    header_txt = normalize_space(table_parser.text(header[0] if header else root))
     mdate = re.search(r"(\d{1,2}\s+\w+\s+\d{4})", header_txt)
     date_iso = None
     if mdate:
@@ -198,17 +163,16 @@ def parse_race_result_page(url):
 
     # Country often appears in breadcrumbs or metadata
     country = None
-    for crumb in soup.select("nav a, .breadcrumb a, .f1-breadcrumb a"):
-        txt = normalize_space(crumb.get_text())
+    for crumb in _CRUMBS(root):
+        txt = normalize_space(table_parser.text(crumb))
         if txt and txt.lower() not in ("home", "results"):
             country = txt
             break
             
     # New code to get circuit name and country from the specified class
-    circuit_tag = soup.select_one("p.typography-module_body-xs-semibold__Fyfwn")
+    circuit_text = table_parser.circuit_text(root)
     circuit = None
-    if circuit_tag:
-        circuit_text = circuit_tag.get_text(" ", strip=True)
+    if circuit_text:
         if "," in circuit_text:
             parts = circuit_text.split(",")
             circuit = parts[0].strip()
@@ -217,12 +181,7 @@ def parse_race_result_page(url):
                 country = parts[1].strip()
 
     # Results table: F1.com uses a standard table; fall back to any table with 'Pos' header
-    tables = soup.select("table")
-    table = None
-    for t in tables:
-        heads = [normalize_space(th.get_text()) for th in t.select("thead th")]
-        if any(h.lower().startswith("pos") for h in heads):
-            table = t; break
+    table = table_parser.find_table(root, lambda heads: any(h.startswith("pos") for h in heads))
     if table is None:
         raise RuntimeError(f"No results table found at {url}")
 
@@ -273,65 +232,163 @@ def map_result_row(row):
         "time_text": normalize_space(time_text), "laps": laps, "status": status
     }
 
-def scrape_year(year:int):
+def build_race_rows(year:int, race:dict, meta:dict, results_rows:list):
+    """Turn one parsed race page into (legacy_races row, legacy_results rows)."""
+    rnd = race["round"]
+    circuit_name = meta.get("circuit")
+    correct_country = meta.get("country")
+
+    if circuit_name:
+        grand_prix_name = circuit_name
+    elif correct_country:
+        grand_prix_name = f"{correct_country} Grand Prix"
+    else:
+        grand_prix_name = f"Round {rnd}"
+
+    # --- Final Override for Abu Dhabi ---
+    if correct_country and "United Arab Emirates" in correct_country:
+        correct_country = "Abu Dhabi"
+        grand_prix_name = "Yas Marina Circuit"
+    # --- End Override ---
+
+    mapped = [map_result_row(x) for x in results_rows if x]
+    payload = [
+        (year, rnd,
+         m["position"], m["driver_name"], m["driver_code"],
+         m["constructor"], m["points"], m["status"], m["time_text"], m["laps"])
+        for m in mapped if m.get("position") is not None
+    ]
+    return (year, rnd, grand_prix_name, correct_country, race["date"]), payload
+
+def write_races(cur, parsed):
+    """Upsert [(race, sha, race_row, payload)] -- one merge per table -- and remember the page fingerprints."""
+    upsert_legacy_races(cur, [race_row for _, _, race_row, _ in parsed])
+    results = [r for _, _, _, payload in parsed for r in payload]
+    if results:
+        upsert_legacy_results(cur, results)
+    record_fingerprints(cur, {race["result_url"]: sha for race, sha, _, _ in parsed})
+
+def scrape_year(year:int, index_html=None, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+                parse_workers:int=2, batch_size:int=5, force:bool=False, every:int=1,
+                resume:bool=False):
+    """
+    Scrape one season: race pages are fetched, parsed and written in an
+    overlapped pipeline (see pipeline.py); `concurrency` fetch workers feed
+    `parse_workers` parsers, and the DB writer upserts `batch_size` races at a time.
+    Network fetches share a RateBudget of `rate` requests/second (None = only the
+    per-host limiters), like the season index fetch.
+    Races whose parsed rows match the last written ones (rows_fingerprint) are
+    not written again unless `force` is set.
+    A batch is written inside a savepoint; if it fails, its races are retried one
+    savepoint each so only the bad race is lost. Work is committed every `every`
+    races (0 = once for the whole year); batches are capped at `every` races so
+    no transaction holds more.
+    Committed rounds are journaled (checkpoint.py); with `resume` they are not
+    fetched again.
+    """
     print(f"[{year}] fetching index…")
-    races = parse_year_index(year)
+    races = parse_year_index(year, index_html)
     print(f"[{year}] found {len(races)} race pages")
-
-    with conn() as connection:
+    if resume:
+        journaled = checkpoint.done_units(JOURNAL, year)
+        races = [r for r in races if str(r["round"]) not in journaled]
+        print(f"[{year}] resuming: {len(races)} round(s) left")
+    unchanged = []
+    bad = []
+
+    budget = RateBudget(rate)   # global cap (requests/s) across the fetch workers; cached pages skip it
+
+    def fetch(race):
+        print(f"  → Round {race['round']}: {race['result_url']}")
+        if not http_client.is_cached(race["result_url"]):
+            budget.wait()
+        return get(race["result_url"]).text
+
+    with conn("f1com") as connection:
         with connection.cursor() as cur:
-            for r in races:
-                rnd = r["round"]
-                url = r["result_url"]
-                print(f"  → Round {rnd}: {url}")
-
+            ensure_fingerprint_table(cur)
+            connection.commit()
+            known = {} if force else load_fingerprints(cur, [r["result_url"] for r in races])
+            committer = Committer(connection, every,
+                                  on_commit=lambda rounds: checkpoint.mark_done(JOURNAL, year, *rounds))
+
+            def parse(race, html):
+                # meta (h1, header date, breadcrumbs, circuit) sits outside <main>, so the
+                # fingerprint covers the parsed rows rather than page_fingerprint's <main> slice
+                meta, results_rows = parse_race_result_page(race["result_url"], html)
+                race_row, payload = build_race_rows(year, race, meta, results_rows)
+                sha = rows_fingerprint(race_row, payload)
+                if known.get(race["result_url"]) == sha:
+                    return None
+                return sha, (race_row, payload)
+
+            def write(batch):
+                parsed = []
+                for race, p in batch:
+                    if p is None:
+                        unchanged.append(race)
+                        checkpoint.mark_done(JOURNAL, year, race["round"])
+                        continue
+                    sha, (race_row, payload) = p
+                    parsed.append((race, sha, race_row, payload))
+                if not parsed:
+                    return
+                committer.make_room(len(parsed))
+                written = parsed
                 try:
-                    meta, results_rows = parse_race_result_page(url)
-                except Exception as e:
-                    print(f"    ! skip (page parse failed): {e}")
-                    continue
-                
-                circuit_name = meta.get("circuit")
-                correct_country = meta.get("country")
-                
-                if circuit_name:
-                    grand_prix_name = circuit_name
-                elif correct_country:
-                    grand_prix_name = f"{correct_country} Grand Prix"
-                else:
-                    grand_prix_name = f"Round {rnd}"
-
-                # --- Final Override for Abu Dhabi ---
-                if correct_country and "United Arab Emirates" in correct_country:
-                    correct_country = "Abu Dhabi"
-                    grand_prix_name = "Yas Marina Circuit"
-                # --- End Override ---
-
-                upsert_legacy_race(cur, year, rnd, grand_prix_name, correct_country, r["date"])
-                
-                mapped = [map_result_row(x) for x in results_rows if x]
-                payload = [
-                    (year, rnd,
-                     m["position"], m["driver_name"], m["driver_code"],
-                     m["constructor"], m["points"], m["status"], m["time_text"], m["laps"])
-                    for m in mapped if m.get("position") is not None
-                ]
-                if payload:
-                    upsert_legacy_results(cur, payload)
-
-        connection.commit()
-
-def scrape_range(start:int, end:int):
-    for y in range(start, end+1):
-        scrape_year(y)
+                    with savepoint(cur, "batch"):
+                        write_races(cur, parsed)
+                except DBError:
+                    written = []
+                    for one in parsed:
+                        try:
+                            with savepoint(cur, "race"):
+                                write_races(cur, [one])
+                            written.append(one)
+                        except DBError as e:
+                            print(f"    ! round {one[0]['round']} rolled back: {e}")
+                            bad.append(one[0])
+                committer.done(*[race["round"] for race, _, _, _ in written])
+
+            failed = run_pipeline(races, fetch, parse, write, fetch_workers=concurrency,
+                                  parse_workers=parse_workers, batch_size=committer.batch_size(batch_size))
+            committer.flush()
+    print(f"[{year}] {len(races) - len(unchanged) - len(failed) - len(bad)} page(s) changed, {len(unchanged)} unchanged")
+    report_stats()
+    if failed or bad:
+        print(f"[{year}] skipped {len(failed) + len(bad)} race page(s)")
+    elif year not in live_seasons():
+        checkpoint.mark_done(JOURNAL, year, checkpoint.YEAR)
+
+def scrape_range(start:int, end:int, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, force:bool=False,
+                 every:int=1, resume:bool=False):
+    years = list(range(start, end+1))
+    if resume:
+        years = [y for y in years if not checkpoint.year_done(JOURNAL, y)]
+        print(f"[resume] years left: {years}")
+    else:
+        checkpoint.reset(JOURNAL, years)
+    indexes = fetch_year_indexes(years, concurrency=concurrency, rate=rate)
+    for y in years:
+        scrape_year(y, indexes.get(y), concurrency=concurrency, rate=rate, force=force, every=every, resume=resume)
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) == 3:
-        s, e = int(sys.argv[1]), int(sys.argv[2])
-    elif len(sys.argv) == 2:
-        s = e = int(sys.argv[1])
+    http_client.offline_from_argv()
+    force = "--force" in sys.argv    # re-parse and re-write pages even if unchanged
+    resume = "--resume" in sys.argv  # continue after the last journaled round
+    args = [a for a in sys.argv[1:] if a not in ("--force", "--resume")]
+    every = 1                        # --commit-every race | N | year
+    if "--commit-every" in args:
+        i = args.index("--commit-every")
+        every = commit_every(args[i + 1])
+        del args[i:i + 2]
+    if len(args) == 2:
+        s, e = int(args[0]), int(args[1])
+    elif len(args) == 1:
+        s = e = int(args[0])
     else:
-        print("Usage: python f1_results_scraper.py <YEAR> [<END_YEAR>]")
+        print("Usage: python f1_results_scraper.py <YEAR> [<END_YEAR>] [--offline] [--force] [--resume] "
+              "[--commit-every race|N|year]")
         sys.exit(1)
-    scrape_range(s, e)
\ No newline at end of file
+    scrape_range(s, e, force=force, every=every, resume=resume)
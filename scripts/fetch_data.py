@@ -1,55 +1,191 @@
-import requests, sqlite3, time, os
-
-db_path = 'data/f1.sqlite'
-first_time = not os.path.exists(db_path)
-conn = sqlite3.connect(db_path)
-cur = conn.cursor()
-
-if first_time:
-    with open('sql/schema.sql', 'r') as f:
-        cur.executescript(f.read())
-    conn.commit()
-
-# # Connect to SQLite database (creates file if not exists)
-# conn = sqlite3.connect('data/f1.sqlite')
-# cur = conn.cursor()
-# # Create tables from schema
-# with open('sql/schema.sql', 'r') as f:
-#     cur.executescript(f.read())
-# conn.commit()
-
-years = list(range(2015, 2022))  # 2015-2021 inclusive
-for year in years:
-    # Fetch and insert all races for the season
-    url = f"https://ergast.com/api/f1/{year}.json"
-    data = requests.get(url).json()
-    races = data['MRData']['RaceTable']['Races']
-    for race in races:
-        race_id = int(race['round']) + (year * 100)  # unique key combining year and round (e.g., 201501 for 2015 round1)
-        cur.execute("INSERT OR REPLACE INTO races VALUES (?, ?, ?, ?, ?, ?);",
-                    (race_id, year, int(race['round']), race['raceName'], race['Circuit']['circuitName'], race['date']))
-    conn.commit()
-    # Fetch results for each race in the season
-    for race in races:
-        round_num = int(race['round'])
-        results_url = f"http://ergast.com/api/f1/{year}/{round_num}/results.json?limit=1000"
-        time.sleep(0.2)  # small delay to respect rate limits
-        results_data = requests.get(results_url).json()
-        if results_data['MRData']['RaceTable']['Races']:
-            results_list = results_data['MRData']['RaceTable']['Races'][0]['Results']
-            race_id = int(race['round']) + (year * 100)
-            for result in results_list:
-                driver = result['Driver']; constructor = result['Constructor']
-                cur.execute("INSERT OR IGNORE INTO drivers VALUES (?, ?, ?, ?, ?);", 
-                            (driver['driverId'], driver.get('code'), driver['givenName'], driver['familyName'], driver['nationality']))
-                cur.execute("INSERT OR IGNORE INTO constructors VALUES (?, ?, ?);", 
-                            (constructor['constructorId'], constructor['name'], constructor['nationality']))
-                cur.execute("""INSERT INTO results 
-                               (raceId, driverId, constructorId, grid, position, points, status) 
-                               VALUES (?, ?, ?, ?, ?, ?, ?);""",
-                            (race_id, driver['driverId'], constructor['constructorId'], int(result['grid'] or 0),
-                             int(result['position'] or 0), float(result['points'] or 0.0), result['status']))
-    conn.commit()
-    print(f"Season {year} data inserted: {len(races)} races, results for all races.")
-
-conn.close()
+# fetch_data.py
+# Bulk Ergast season loader.
+#
+# A season's results come from the season-level /{year}/results feed, paged
+# with limit/offset (PAGE_SIZE rows per request) instead of one request per
+# round: ~5 requests for a full season rather than 20+. The first page of
+# every season (and its schedule) is fetched up front on the shared fetch
+# engine, then all remaining pages, both with bounded concurrency. Each
+# season is written with batched upserts in a single transaction.
+#
+# --laps loads lap times and pit stops instead: /{year}/{round}/laps and
+# /pitstops are paged per race the same way, one season at a time so memory
+# stays at one season of timings; "1:31.456" strings are turned into integer
+# milliseconds in one vectorized pandas step.
+#
+# Data goes to the "ergast" storage source: data/f1.sqlite with the bundled
+# sql/sqlite/ergast.sql schema by default (F1_STORAGE=postgres to use RDS).
+import argparse
+from datetime import date
+
+import pandas as pd
+
+import http_client
+from fetch_engine import fetch_all, DEFAULT_CONCURRENCY
+from storage import conn, upsert, upsert_df
+
+ERGAST = "https://ergast.com/api/f1"
+PAGE_SIZE = 100    # rows per request; the API caps `limit`
+
+RACE_COLUMNS = ("raceId", "year", "round", "name", "circuit", "date")
+DRIVER_COLUMNS = ("driverId", "code", "forename", "surname", "nationality")
+CONSTRUCTOR_COLUMNS = ("constructorId", "name", "nationality")
+RESULT_COLUMNS = ("raceId", "driverId", "constructorId", "grid", "position", "points", "status")
+LAP_COLUMNS = ["race_id", "driver_id", "lap_number", "position", "lap_time"]          # + milliseconds
+PIT_COLUMNS = ["race_id", "driver_id", "stop", "lap", "time", "duration"]              # + milliseconds
+
+
+def race_id(year, round_):
+    return year * 100 + int(round_)   # unique key combining year and round (e.g., 201501 for 2015 round1)
+
+
+def page_url(path, offset=0, limit=PAGE_SIZE):
+    return f"{ERGAST}/{path}.json?limit={limit}&offset={offset}"
+
+
+def get_json(url):
+    return http_client.get(url).json()["MRData"]
+
+
+def fetch_pages(paths, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Fetch every page of each paged Ergast `path` -> {path: [MRData, ...]} in offset order.
+    First pages go out together (they tell the totals), then all the rest.
+    """
+    first = fetch_all([page_url(p) for p in paths], get_json, concurrency=concurrency,
+                      is_cached=http_client.is_cached)
+    pages = {}
+    rest = []
+    for p in paths:
+        page = first[page_url(p)]
+        if isinstance(page, Exception):
+            raise page
+        pages[p] = [page]
+        rest += [(p, page_url(p, off)) for off in range(PAGE_SIZE, int(page["total"]), PAGE_SIZE)]
+    more = fetch_all([u for _, u in rest], get_json, concurrency=concurrency, is_cached=http_client.is_cached)
+    for p, u in rest:
+        if isinstance(more[u], Exception):
+            raise more[u]
+        pages[p].append(more[u])
+    return pages
+
+
+def merge_races(pages, key="Results"):
+    """Races of a paged feed; a race split across two pages gets its `key` list re-joined."""
+    races = {}
+    for page in pages:
+        for race in page["RaceTable"]["Races"]:
+            rnd = int(race["round"])
+            if rnd in races:
+                races[rnd][key] += race.get(key, [])
+            else:
+                races[rnd] = dict(race, **{key: list(race.get(key, []))})
+    return [races[r] for r in sorted(races)]
+
+
+def season_rows(year, schedule, results):
+    """(race, driver, constructor, result) row lists for one season."""
+    race_rows = [(race_id(year, r["round"]), year, int(r["round"]), r["raceName"], r["Circuit"]["circuitName"], r["date"])
+                 for r in schedule]
+    drivers, constructors, result_rows = {}, {}, []
+    for race in results:
+        rid = race_id(year, race["round"])
+        for result in race["Results"]:
+            driver = result["Driver"]; constructor = result["Constructor"]
+            drivers[driver["driverId"]] = (driver["driverId"], driver.get("code"), driver["givenName"],
+                                           driver["familyName"], driver["nationality"])
+            constructors[constructor["constructorId"]] = (constructor["constructorId"], constructor["name"],
+                                                          constructor["nationality"])
+            result_rows.append((rid, driver["driverId"], constructor["constructorId"], int(result["grid"] or 0),
+                                int(result["position"] or 0), float(result["points"] or 0.0), result["status"]))
+    return race_rows, list(drivers.values()), list(constructors.values()), result_rows
+
+
+def write_season(cur, rows):
+    race_rows, driver_rows, constructor_rows, result_rows = rows
+    upsert(cur, "races", RACE_COLUMNS, race_rows, conflict=("raceId",))
+    upsert(cur, "drivers", DRIVER_COLUMNS, driver_rows, conflict=("driverId",), update=[])
+    upsert(cur, "constructors", CONSTRUCTOR_COLUMNS, constructor_rows, conflict=("constructorId",), update=[])
+    upsert(cur, "results", RESULT_COLUMNS, result_rows, conflict=("raceId", "driverId"))
+
+
+def to_milliseconds(times):
+    """'1:31.456' / '22.123' strings -> nullable integer milliseconds, vectorized over a Series."""
+    parts = times.astype("string").str.extract(r"^(?:(\d+):)?(\d+(?:\.\d+)?)$")
+    minutes = pd.to_numeric(parts[0]).fillna(0)
+    seconds = pd.to_numeric(parts[1])
+    return ((minutes * 60 + seconds) * 1000).round().astype("Int64")
+
+
+def _frame(rows, columns, time_column):
+    df = pd.DataFrame(rows, columns=columns)
+    df["milliseconds"] = to_milliseconds(df[time_column])
+    return df.astype(object).where(df.notna(), None)   # NA -> NULL for both backends
+
+
+def lap_frame(year, races):
+    """lap_times rows (race_id, driver_id, lap_number, position, lap_time, milliseconds)."""
+    rows = [(race_id(year, race["round"]), t["driverId"], int(lap["number"]), int(t["position"]), t["time"])
+            for race in races for lap in race["Laps"] for t in lap["Timings"]]
+    return _frame(rows, LAP_COLUMNS, "lap_time")
+
+
+def pit_frame(year, races):
+    """pit_stops rows (race_id, driver_id, stop, lap, time, duration, milliseconds)."""
+    rows = [(race_id(year, race["round"]), p["driverId"], int(p["stop"]), int(p["lap"]), p["time"], p["duration"])
+            for race in races for p in race["PitStops"]]
+    return _frame(rows, PIT_COLUMNS, "duration")
+
+
+def load_laps(start, end, concurrency=DEFAULT_CONCURRENCY):
+    years = list(range(start, end + 1))
+    schedules = fetch_pages([str(y) for y in years], concurrency=concurrency)
+    today = date.today().isoformat()
+
+    with conn("ergast") as connection:
+        with connection.cursor() as cur:
+            for year in years:
+                rounds = [r["round"] for r in merge_races(schedules[str(year)]) if r["date"] <= today]
+                paths = [f"{year}/{r}/{feed}" for r in rounds for feed in ("laps", "pitstops")]
+                pages = fetch_pages(paths, concurrency=concurrency)
+                laps = lap_frame(year, [race for r in rounds for race in merge_races(pages[f"{year}/{r}/laps"], "Laps")])
+                pits = pit_frame(year, [race for r in rounds
+                                        for race in merge_races(pages[f"{year}/{r}/pitstops"], "PitStops")])
+                upsert_df(cur, laps, "lap_times", ("race_id", "driver_id", "lap_number"))
+                upsert_df(cur, pits, "pit_stops", ("race_id", "driver_id", "stop"))
+                connection.commit()       # one transaction per season
+                print(f"Season {year}: {len(laps)} lap times, {len(pits)} pit stops "
+                      f"from {sum(len(p) for p in pages.values())} requests.")
+
+
+def load_seasons(start, end, concurrency=DEFAULT_CONCURRENCY):
+    years = list(range(start, end + 1))
+    paths = [str(y) for y in years] + [f"{y}/results" for y in years]
+    pages = fetch_pages(paths, concurrency=concurrency)
+    print(f"Fetched {sum(len(p) for p in pages.values())} pages for {len(years)} season(s)")
+
+    with conn("ergast") as connection:
+        with connection.cursor() as cur:
+            for year in years:
+                schedule = merge_races(pages[str(year)])
+                results = merge_races(pages[f"{year}/results"])
+                rows = season_rows(year, schedule, results)
+                write_season(cur, rows)
+                connection.commit()       # one transaction per season
+                print(f"Season {year} data inserted: {len(rows[0])} races, {len(rows[3])} results.")
+
+
+if __name__ == "__main__":
+    http_client.offline_from_argv()
+    parser = argparse.ArgumentParser(description="Load Ergast seasons (races, drivers, constructors, results).")
+    parser.add_argument("start", type=int, nargs="?", default=2015)
+    parser.add_argument("end", type=int, nargs="?", default=2021)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Ergast requests in flight at once.")
+    parser.add_argument("--laps", action="store_true",
+                        help="Load lap times and pit stops instead of results.")
+    args = parser.parse_args()
+    if args.laps:
+        load_laps(args.start, args.end, concurrency=args.concurrency)
+    else:
+        load_seasons(args.start, args.end, concurrency=args.concurrency)
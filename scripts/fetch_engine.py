@@ -0,0 +1,96 @@
+# fetch_engine.py
+# Concurrent page fetching for the formula1.com scrapers.
+#
+# requests is blocking, so each fetch runs on a worker thread driven by an
+# asyncio event loop. Per-host pacing is done by the shared HTTP client
+# (rate_control.py); on top of that the engine has two knobs:
+#   * concurrency - how many requests may be in flight at once
+#   * rate        - optional global cap on network requests per second
+#                   (all workers); None leaves pacing to the host limiters
+# Pages already in the local cache skip the rate budget entirely.
+import asyncio
+import threading
+import time
+
+import requests
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = None  # requests/second; the per-host limiters already keep us polite
+
+
+class RateBudget:
+    """
+    Spaces request starts so the engine never exceeds `rate` requests/second.
+    Usable from the event loop (acquire) and from plain worker threads (wait),
+    e.g. the fetch workers of pipeline.run_pipeline.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()    # held only to book a slot, never across a sleep
+
+    def _delay(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        return start - now
+
+    async def acquire(self):
+        if self.interval:
+            delay = self._delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def wait(self):
+        if self.interval:
+            delay = self._delay()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def cached_predicate(session):
+    """Return a url -> bool check telling whether `session` can serve url from cache."""
+    cache = getattr(session, "cache", None)
+    if cache is None:
+        return None
+
+    def is_cached(url):
+        try:
+            key = cache.create_key(session.prepare_request(requests.Request("GET", url)))
+            resp = cache.get_response(key)
+        except Exception:
+            return False
+        return resp is not None and not resp.is_expired
+
+    return is_cached
+
+
+async def _fetch_all(urls, fetch, concurrency, rate, is_cached):
+    sem = asyncio.Semaphore(max(1, concurrency))
+    budget = RateBudget(rate)
+
+    async def one(url):
+        async with sem:
+            if not (is_cached and is_cached(url)):
+                await budget.acquire()
+            try:
+                return url, await asyncio.to_thread(fetch, url)
+            except Exception as e:
+                return url, e
+
+    return dict(await asyncio.gather(*(one(u) for u in urls)))
+
+
+def fetch_all(urls, fetch, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, is_cached=None):
+    """
+    Fetch every url concurrently with the blocking callable `fetch(url)`.
+
+    Returns {url: result}; a failed fetch maps to the exception it raised so
+    callers can skip that page and carry on with the rest of the season.
+    """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    return asyncio.run(_fetch_all(urls, fetch, concurrency, rate, is_cached))
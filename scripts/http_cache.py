@@ -0,0 +1,55 @@
+# http_cache.py
+# Cache policy for the shared HTTP client (see http_client.py).
+#
+# Expiry is decided per URL instead of a flat 24h cutoff:
+#   * results pages of finished seasons never change -> never expire
+#   * the live season (and the previous one until the new season starts)
+#     expires quickly, but an expired entry is revalidated with
+#     If-None-Match / If-Modified-Since; a 304 just refreshes the cached copy
+#   * OpenF1 is not cached (live timing data; session keys don't tell the year)
+#   * anything else keeps the old 24h policy
+# requests_cache sends the conditional headers itself whenever a stale entry
+# carries an ETag or Last-Modified validator.
+from datetime import date
+
+from requests_cache import NEVER_EXPIRE, DO_NOT_CACHE
+
+CACHE_NAME = "f1_cache"
+F1_HOST = "www.formula1.com"
+ERGAST_HOST = "ergast.com"
+OPENF1_HOST = "api.openf1.org"
+DEFAULT_EXPIRY = 24 * 3600        # seconds
+LIVE_SEASON_EXPIRY = 3600         # short TTL; stale entries are revalidated, not re-downloaded
+SEASON_START_MONTH = 3            # before March last year's pages may still be amended
+
+
+def live_seasons(today=None):
+    """Seasons whose result pages can still change."""
+    today = today or date.today()
+    years = [today.year]
+    if today.month < SEASON_START_MONTH:
+        years.append(today.year - 1)
+    return years
+
+
+def expiry_policies(today=None):
+    """Per-URL expiry map for requests_cache (first matching glob wins)."""
+    policies = {f"{OPENF1_HOST}/*": DO_NOT_CACHE}
+    for y in live_seasons(today):
+        policies[f"{F1_HOST}/en/results/{y}/*"] = LIVE_SEASON_EXPIRY
+        policies[f"{F1_HOST}/en/results.html/{y}/*"] = LIVE_SEASON_EXPIRY
+        policies[f"{ERGAST_HOST}/api/f1/{y}*"] = LIVE_SEASON_EXPIRY
+    policies[f"{ERGAST_HOST}/api/f1/current*"] = LIVE_SEASON_EXPIRY
+    policies[f"{F1_HOST}/en/results/*"] = NEVER_EXPIRE
+    policies[f"{F1_HOST}/en/results.html/*"] = NEVER_EXPIRE
+    policies[f"{ERGAST_HOST}/api/f1/*"] = NEVER_EXPIRE
+    return policies
+
+
+def cache_options():
+    """Keyword arguments for requests_cache.CachedSession."""
+    return {
+        "expire_after": DEFAULT_EXPIRY,
+        "urls_expire_after": expiry_policies(),
+        "stale_if_error": True,   # serve the old copy if revalidation fails
+    }
@@ -0,0 +1,94 @@
+# http_client.py
+# One pooled, cached HTTP session shared by every scraper.
+#
+# Keeps TLS connections alive between requests (formula1.com, OpenF1, Ergast),
+# retries transient failures with backoff, paces each host adaptively
+# (rate_control.py), sends the same User-Agent everywhere and routes
+# everything through the requests_cache policy in http_cache.py.
+# Every successful body is also written to the permanent page archive
+# (page_archive.py); in offline mode pages are replayed from that archive
+# and no request ever leaves the machine.
+import sys
+
+import requests
+import requests_cache
+from urllib3.util.retry import Retry
+
+import page_archive
+from fetch_engine import cached_predicate
+from http_cache import CACHE_NAME, cache_options
+from rate_control import ThrottledAdapter
+
+USER_AGENT = "F1ApexAnalyst/1.0 (academic/personal project; contact: you@example.com)"
+POOL_SIZE = 10      # keep-alive connections per host
+RETRIES = 3
+BACKOFF = 1.0       # seconds, doubled on every retry
+TIMEOUT = 30
+
+OFFLINE = False
+
+
+class NotArchived(requests.exceptions.RequestException):
+    """Offline mode was asked for a URL that was never archived."""
+
+
+def make_session(cache_name=CACHE_NAME):
+    session = requests_cache.CachedSession(cache_name, **cache_options())
+    retry = Retry(
+        total=RETRIES,
+        backoff_factor=BACKOFF,
+        status_forcelist=(500, 502, 504),   # 429/503 are handled by ThrottledAdapter
+        allowed_methods=("GET", "HEAD"),
+        raise_on_status=False,   # hand the final response back; raise_for_status decides
+    )
+    adapter = ThrottledAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+
+SESSION = make_session()
+_in_cache = cached_predicate(SESSION)
+
+
+def set_offline(enabled=True):
+    global OFFLINE
+    OFFLINE = enabled
+
+
+def offline_from_argv(argv=None):
+    """Strip `--offline` from argv (sys.argv by default) and switch to archive replay if present."""
+    argv = sys.argv if argv is None else argv
+    if "--offline" in argv:
+        argv.remove("--offline")
+        set_offline(True)
+        print("[offline] replaying pages from the archive, no network requests")
+    return OFFLINE
+
+
+def full_url(url, params=None):
+    """URL with query string applied, as used for the archive key."""
+    return requests.Request("GET", url, params=params).prepare().url
+
+
+def is_cached(url):
+    """True when url will be served without a network request (cache or offline archive)."""
+    return OFFLINE or bool(_in_cache and _in_cache(url))
+
+
+def get(url, params=None, timeout=TIMEOUT):
+    """GET through the shared session; raises for 4xx/5xx."""
+    key = full_url(url, params)
+    if OFFLINE:
+        resp = page_archive.latest(key)
+        if resp is None:
+            raise NotArchived(f"not in archive: {key}")
+        return resp
+
+    resp = SESSION.get(url, params=params, timeout=timeout)
+    resp.raise_for_status()
+    if not getattr(resp, "from_cache", False) or not page_archive.has(key):
+        page_archive.store(key, resp.content, resp.status_code,
+                           resp.headers.get("Content-Type"), resp.encoding)
+    return resp
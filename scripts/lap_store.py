@@ -0,0 +1,166 @@
+# lap_store.py
+# Local columnar copy of the Ergast lap_times table for analysis.
+#
+# Layout (under data/lap_store/):
+#   race_id.npy  int32   lap_number.npy  int16   position.npy  int16
+#   driver.npy   int16   code into drivers.json (driver_id strings, sorted)
+#   milliseconds.npy int32   (-1 = no time recorded; position -1 = unknown)
+#   index.npy    int64   rows of (race_id, driver code, start, stop)
+#
+# Rows are sorted by (race_id, driver, lap_number), so every driver's race is
+# one contiguous run and the index maps it to a [start, stop) slice. Files are
+# opened with np.load(mmap_mode="r"): opening the full history reads only
+# the .npy headers, and a slice is a zero-copy view whose pages are read on
+# first touch. Lookups go through a dict built from the (small) index.
+#
+#   store = LapStore.open()
+#   laps = store.laps(202105, "hamilton")     # LapSlice of array views
+#   laps.milliseconds.mean()
+#
+# `python lap_store.py build` rebuilds it from the "ergast" storage source
+# (fetch_data.py --laps); the new store is written next to the old one and
+# swapped in when complete.
+import argparse
+import json
+import os
+import shutil
+from collections import namedtuple
+
+import numpy as np
+
+from storage import conn
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "lap_store")
+MISSING = -1
+CHUNK_ROWS = 50_000            # rows per fetch while building
+
+COLUMNS = {"race_id": np.int32, "driver": np.int16, "lap_number": np.int16,
+           "position": np.int16, "milliseconds": np.int32}
+
+LapSlice = namedtuple("LapSlice", "lap_number position milliseconds")
+
+
+def _column(values, dtype):
+    return np.array([MISSING if v is None else v for v in values], dtype=dtype)
+
+
+def build(source="ergast", store_dir=STORE_DIR, chunk_rows=CHUNK_ROWS):
+    """
+    Rebuild the store from `source`'s lap_times; returns the number of laps.
+    Rows are streamed `chunk_rows` at a time (server-side cursor on Postgres)
+    straight into pre-sized .npy memmaps, so the table is never held in memory.
+    """
+    tmp = f"{store_dir}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    with conn(source) as connection:
+        with connection.cursor() as cur:
+            cur.execute("SELECT count(*) FROM lap_times")
+            n = cur.fetchone()[0]
+            cur.execute("SELECT DISTINCT driver_id FROM lap_times")
+            drivers = sorted(d for (d,) in cur.fetchall())
+        codes = {d: i for i, d in enumerate(drivers)}
+        columns = {name: np.lib.format.open_memmap(os.path.join(tmp, f"{name}.npy"), mode="w+",
+                                                   dtype=dtype, shape=(n,))
+                   for name, dtype in COLUMNS.items()}
+        starts = []          # (race_id, driver code, row) where a (race_id, driver) run begins
+        at, last = 0, None
+        with connection.cursor(name="lap_store_build") as cur:
+            cur.execute("SELECT race_id, driver_id, lap_number, position, milliseconds FROM lap_times "
+                        "ORDER BY race_id, driver_id, lap_number")
+            while True:
+                rows = cur.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                stop = at + len(rows)
+                if stop > n:
+                    raise RuntimeError("lap_times changed during the build; run it again")
+                race_ids, driver_ids, laps, positions, ms = zip(*rows)
+                chunk = {
+                    "race_id": _column(race_ids, COLUMNS["race_id"]),
+                    "driver": np.array([codes[d] for d in driver_ids], dtype=COLUMNS["driver"]),
+                    "lap_number": _column(laps, COLUMNS["lap_number"]),
+                    "position": _column(positions, COLUMNS["position"]),
+                    "milliseconds": _column(ms, COLUMNS["milliseconds"]),
+                }
+                for name, values in chunk.items():
+                    columns[name][at:stop] = values
+                # rows arrive grouped by (race_id, driver), so each run is one [start, stop) slice
+                key = chunk["race_id"].astype(np.int64) << 16 | chunk["driver"]
+                new = np.flatnonzero(np.r_[key[0] != last, key[1:] != key[:-1]])
+                starts.append(np.column_stack([chunk["race_id"][new], chunk["driver"][new], at + new]))
+                at, last = stop, key[-1]
+    if at != n:
+        raise RuntimeError("lap_times changed during the build; run it again")
+    for values in columns.values():
+        values.flush()
+    del columns
+
+    starts = np.concatenate(starts).astype(np.int64) if starts else np.empty((0, 3), dtype=np.int64)
+    stops = np.r_[starts[1:, 2], n] if len(starts) else np.empty(0, dtype=np.int64)
+    index = np.column_stack([starts, stops]).astype(np.int64)
+    np.save(os.path.join(tmp, "index.npy"), index.reshape(-1, 4))
+    with open(os.path.join(tmp, "drivers.json"), "w") as f:
+        json.dump(drivers, f)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp, store_dir)
+    return n
+
+
+class LapStore:
+    def __init__(self, store_dir, columns, index, drivers):
+        self.store_dir = store_dir
+        self.columns = columns
+        self.index = index
+        self.drivers = drivers
+        self._codes = {d: i for i, d in enumerate(drivers)}
+        self._slices = None
+
+    @classmethod
+    def open(cls, store_dir=STORE_DIR):
+        columns = {name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+        index = np.load(os.path.join(store_dir, "index.npy"), mmap_mode="r")
+        with open(os.path.join(store_dir, "drivers.json")) as f:
+            drivers = json.load(f)
+        return cls(store_dir, columns, index, drivers)
+
+    def __len__(self):
+        return len(self.columns["race_id"])
+
+    def _slice(self, race_id, driver_id):
+        if self._slices is None:
+            self._slices = {(int(r), int(d)): (int(a), int(b)) for r, d, a, b in self.index}
+        code = self._codes.get(driver_id)
+        return self._slices.get((race_id, code))
+
+    def laps(self, race_id, driver_id):
+        """One driver's laps in a race as zero-copy views (empty if there are none)."""
+        start, stop = self._slice(race_id, driver_id) or (0, 0)
+        return LapSlice(*(self.columns[c][start:stop] for c in LapSlice._fields))
+
+    def race(self, race_id):
+        """{driver_id: LapSlice} for every driver with laps in `race_id`."""
+        rows = self.index[np.searchsorted(self.index[:, 0], race_id, "left"):
+                          np.searchsorted(self.index[:, 0], race_id, "right")]
+        return {self.drivers[int(d)]: LapSlice(*(self.columns[c][int(a):int(b)] for c in LapSlice._fields))
+                for _, d, a, b in rows}
+
+
+if __name__ == "__main__":
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--dir", default=STORE_DIR)
+    parser = argparse.ArgumentParser(description="Memory-mapped lap time store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", parents=[common], help="Rebuild from lap_times.")
+    build_cmd.add_argument("--source", default="ergast")
+    show_cmd = sub.add_parser("show", parents=[common], help="Print one driver's laps in a race.")
+    show_cmd.add_argument("race_id", type=int)
+    show_cmd.add_argument("driver_id")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(f"{build(args.source, args.dir)} laps -> {args.dir}")
+    else:
+        laps = LapStore.open(args.dir).laps(args.race_id, args.driver_id)
+        for lap, pos, ms in zip(*laps):
+            print(f"lap {lap:3d}  P{pos:<3d} {ms / 1000:9.3f}s" if ms != MISSING else f"lap {lap:3d}  P{pos:<3d} -")
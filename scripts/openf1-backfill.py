@@ -1,25 +1,31 @@
 # openf1_backfill.py (normalized tables)
-import sys, time, requests, psycopg2
-from psycopg2.extras import execute_values
+import argparse, requests
+from db import savepoint, Committer, commit_every, COMMIT_CHOICES
+from storage import conn, ddl, execute_values, upsert, Error as DBError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import http_client
+import checkpoint
+from http_cache import live_seasons
+from openf1_telemetry import load_session_telemetry
+from openf1_schema import ensure_strategy_tables
 
-DB_HOST = "database-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com"
-DB_NAME = "postgres"
-DB_USER = "postgres"
-DB_PASSWORD = "OnePieceReal.7143"
-DB_SSLMODE = "require"
 
 API = "https://api.openf1.org/v1"
 
-def conn():
-    return psycopg2.connect(
-        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
-        port=5432, sslmode=DB_SSLMODE
-    )
+LAP_COLUMNS = ("session_key", "driver_number", "lap_number", "lap_time_ms",
+               "sector1_ms", "sector2_ms", "sector3_ms", "position")
+
+DEFAULT_WORKERS = 8   # concurrent HTTP fetches; pacing per host is still done by rate_control
+
+# per-session endpoints, fetched together for every session
+SESSION_ENDPOINTS = ("drivers", "session_results", "laps", "stints", "pit")
+SETTLE_TIME = timedelta(days=2)   # results/laps may still be corrected shortly after a race
+DEFAULT_COMMIT_EVERY = 1   # sessions per transaction; 0 = one transaction per year
+JOURNAL = "openf1"         # checkpoint source name; units are session_keys
 
 def get(url, params=None):
-    r = requests.get(url, params=params, timeout=60)
-    r.raise_for_status()
-    return r.json()
+    return http_client.get(url, params=params, timeout=60).json()
 
 # --- upsert helpers (same SQL as loader) ---
 def upsert_race(cur, session):
@@ -48,9 +54,10 @@ def upsert_race(cur, session):
     execute_values(cur, sql, [row])
 
 # ---------- Get Driver data ----------
-def upsert_drivers_for_session(cur, session_key:int):
+def upsert_drivers_for_session(cur, session_key:int, drivers=None):
     # Prefer per-session scope so we only insert active drivers we actually see
-    drivers = get(f"{API}/drivers", {"session_key": session_key})
+    if drivers is None:
+        drivers = get(f"{API}/drivers", {"session_key": session_key})
     if not drivers:
         return 0
     rows = []
@@ -74,8 +81,9 @@ def upsert_drivers_for_session(cur, session_key:int):
     execute_values(cur, sql, rows)
     return len(rows)
 
-def upsert_results(cur, session_key:int):
-    res = get(f"{API}/session_results", {"session_key": session_key})
+def upsert_results(cur, session_key:int, res=None):
+    if res is None:
+        res = get(f"{API}/session_results", {"session_key": session_key})
     if not res:
         return 0
     rows = [(r.get("session_key"), r.get("driver_number"), r.get("position"), r.get("points"), r.get("status"), r.get("team_name")) for r in res]
@@ -91,56 +99,233 @@ def upsert_results(cur, session_key:int):
     execute_values(cur, sql, rows)
     return len(rows)
 
-def upsert_laps(cur, session_key:int):
-    laps = get(f"{API}/laps", {"session_key": session_key})
+def upsert_laps(cur, session_key:int, laps=None):
+    if laps is None:
+        laps = get(f"{API}/laps", {"session_key": session_key})
     if not laps:
         return 0
     rows = [(r.get("session_key"), r.get("driver_number"), r.get("lap_number"), r.get("lap_duration"),
              r.get("s1_duration"), r.get("s2_duration"), r.get("s3_duration"), r.get("position")) for r in laps]
+    # COPY into a staging table, then one ON CONFLICT merge into lap_times
+    upsert(cur, "lap_times", LAP_COLUMNS, rows, conflict=("session_key", "driver_number", "lap_number"))
+    return len(rows)
+
+def upsert_stints(cur, session_key:int, stints=None):
+    if stints is None:
+        stints = get(f"{API}/stints", {"session_key": session_key})
+    if not stints:
+        return 0
+    rows = [(r.get("session_key"), r.get("driver_number"), r.get("stint_number"), r.get("lap_start"),
+             r.get("lap_end"), r.get("compound"), r.get("tyre_age_at_start")) for r in stints]
     sql = """
-        INSERT INTO lap_times(session_key, driver_number, lap_number, lap_time_ms, sector1_ms, sector2_ms, sector3_ms, position)
+        INSERT INTO stints(session_key, driver_number, stint_number, lap_start, lap_end, compound, tyre_age_at_start)
+        VALUES %s
+        ON CONFLICT (session_key, driver_number, stint_number) DO UPDATE
+        SET lap_start         = EXCLUDED.lap_start,
+            lap_end           = EXCLUDED.lap_end,
+            compound          = EXCLUDED.compound,
+            tyre_age_at_start = EXCLUDED.tyre_age_at_start;
+    """
+    # whole session in one statement
+    execute_values(cur, sql, rows, page_size=len(rows))
+    return len(rows)
+
+def upsert_pits(cur, session_key:int, pits=None):
+    if pits is None:
+        pits = get(f"{API}/pit", {"session_key": session_key})
+    if not pits:
+        return 0
+    rows = [(r.get("session_key"), r.get("driver_number"), r.get("lap_number"), r.get("pit_duration"),
+             r.get("date")) for r in pits]
+    sql = """
+        INSERT INTO pit_stops(session_key, driver_number, lap_number, pit_duration, date)
         VALUES %s
         ON CONFLICT (session_key, driver_number, lap_number) DO UPDATE
-        SET lap_time_ms = EXCLUDED.lap_time_ms,
-            sector1_ms  = EXCLUDED.sector1_ms,
-            sector2_ms  = EXCLUDED.sector2_ms,
-            sector3_ms  = EXCLUDED.sector3_ms,
-            position    = EXCLUDED.position;
+        SET pit_duration = EXCLUDED.pit_duration,
+            date         = EXCLUDED.date;
     """
-    execute_values(cur, sql, rows)
+    execute_values(cur, sql, rows, page_size=len(rows))
     return len(rows)
 
+# --- completeness watermarks: one row per loaded session ---
+def ensure_watermark_table(cur):
+    ddl(cur, """
+        CREATE TABLE IF NOT EXISTS load_watermarks (
+            session_key      INTEGER PRIMARY KEY,
+            drivers_rows     INTEGER NOT NULL DEFAULT 0,
+            results_rows     INTEGER NOT NULL DEFAULT 0,
+            laps_rows        INTEGER NOT NULL DEFAULT 0,
+            loaded_at        TIMESTAMPTZ NOT NULL DEFAULT now(),
+            session_finished BOOLEAN NOT NULL DEFAULT FALSE
+        );
+        ALTER TABLE load_watermarks ADD COLUMN IF NOT EXISTS telemetry_rows BIGINT;
+        ALTER TABLE load_watermarks ADD COLUMN IF NOT EXISTS stints_rows INTEGER;
+        ALTER TABLE load_watermarks ADD COLUMN IF NOT EXISTS pit_rows INTEGER;
+    """)
+
+def complete_sessions(cur, telemetry:bool=False):
+    """Session keys that were loaded after the session finished and had results, laps
+    and stints (and car telemetry, when `telemetry` is requested)."""
+    cur.execute(f"""
+        SELECT session_key FROM load_watermarks
+        WHERE session_finished AND results_rows > 0 AND laps_rows > 0 AND stints_rows > 0
+        {"AND telemetry_rows > 0" if telemetry else ""};
+    """)
+    return {r[0] for r in cur.fetchall()}
+
+def session_finished(session, now=None):
+    """True once the session ended more than SETTLE_TIME ago."""
+    end = session.get("date_end")
+    if not end:
+        return False
+    end = datetime.fromisoformat(end)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    return end + SETTLE_TIME < (now or datetime.now(timezone.utc))
+
+def record_watermark(cur, session_key:int, drivers_rows:int, results_rows:int, laps_rows:int,
+                     stints_rows:int, pit_rows:int, finished:bool, telemetry_rows=None):
+    # telemetry_rows=None means telemetry wasn't loaded this run: keep the previous count
+    sql = """
+        INSERT INTO load_watermarks(session_key, drivers_rows, results_rows, laps_rows, stints_rows, pit_rows,
+                                    loaded_at, session_finished, telemetry_rows)
+        VALUES %s
+        ON CONFLICT (session_key) DO UPDATE
+        SET drivers_rows     = EXCLUDED.drivers_rows,
+            results_rows     = EXCLUDED.results_rows,
+            laps_rows        = EXCLUDED.laps_rows,
+            stints_rows      = EXCLUDED.stints_rows,
+            pit_rows         = EXCLUDED.pit_rows,
+            loaded_at        = EXCLUDED.loaded_at,
+            session_finished = EXCLUDED.session_finished,
+            telemetry_rows   = COALESCE(EXCLUDED.telemetry_rows, load_watermarks.telemetry_rows);
+    """
+    execute_values(cur, sql, [(session_key, drivers_rows, results_rows, laps_rows, stints_rows, pit_rows,
+                               datetime.now(timezone.utc), finished, telemetry_rows)])
+
 def list_race_sessions(year:int):
     rows = get(f"{API}/sessions", {"year": year, "session_name": "Race"})
     rows.sort(key=lambda s: s.get("date_start") or "")
     return rows
 
-def backfill_year(year:int):
-    sessions = list_race_sessions(year)
-    print(f"[{year}] {len(sessions)} race sessions")
+def submit_session_fetches(pool, session_keys):
+    """
+    Queue every per-session endpoint on the pool -> {session_key: {endpoint: future}}.
+
+    One request per session and endpoint, filtered on session_key itself:
+    OpenF1 has no filter that selects exactly a set of race sessions (a
+    session_key range or a meeting_key also returns practice, qualifying and
+    sprint sessions), so wider queries would only fetch data to throw away.
+    """
+    return {sk: {ep: pool.submit(get, f"{API}/{ep}", {"session_key": sk}) for ep in SESSION_ENDPOINTS}
+            for sk in session_keys}
+
+def backfill_year(year:int, sessions=None, workers:int=DEFAULT_WORKERS,
+                  full:bool=False, telemetry:bool=False, every:int=DEFAULT_COMMIT_EVERY,
+                  resume:bool=False):
+    """
+    Load every race session of `year`.
+
+    All sessions x endpoints are fetched concurrently on a bounded pool while
+    this thread writes finished sessions to the DB in calendar order.
+    Sessions already fully loaded (see load_watermarks) are skipped unless `full`.
+    With `telemetry`, car_data/location are streamed in after each session's laps.
+    Each session is written inside a savepoint, so a failing one is rolled back
+    and skipped on its own; the work is committed every `every` sessions
+    (0 = once at the end of the year).
+    Committed sessions of finished races are journaled (checkpoint.py); with
+    `resume` they are skipped without touching the API or the watermarks.
+    """
+    if sessions is None:
+        sessions = list_race_sessions(year)
     total_res = total_lap = 0
-    with conn() as connection:
+    failed = []
+    journaled = checkpoint.done_units(JOURNAL, year) if resume else set()
+    sessions = [s for s in sessions if str(s.get("session_key")) not in journaled]
+
+    def journal(units):
+        # sessions that may still change (not finished / not settled) are not journaled
+        checkpoint.mark_done(JOURNAL, year, *[sk for sk in units if sk is not None])
+    with conn("openf1") as connection:
         with connection.cursor() as cur:
-            for s in sessions:
-                sk = s.get("session_key")
-                print(f"  → {s.get('event_name')} | session_key={sk}")
-                upsert_race(cur, s)
-                upsert_drivers_for_session(cur, sk)
-                total_res += upsert_results(cur, sk)
-                total_lap += upsert_laps(cur, sk)
-        connection.commit()
+            ensure_watermark_table(cur)
+            ensure_strategy_tables(cur)
+            connection.commit()
+            done = set() if full else complete_sessions(cur, telemetry)
+            todo = [s for s in sessions if s.get("session_key") not in done]
+            print(f"[{year}] {len(sessions)} race sessions, {len(sessions) - len(todo)} already complete")
+            committer = Committer(connection, every, on_commit=journal)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futs = submit_session_fetches(pool, [s.get("session_key") for s in todo])
+                for s in todo:
+                    sk = s.get("session_key")
+                    print(f"  → {s.get('event_name')} | session_key={sk}")
+                    try:
+                        data = {ep: f.result() for ep, f in futs[sk].items()}
+                        with savepoint(cur, "session"):
+                            upsert_race(cur, s)
+                            n_drv = upsert_drivers_for_session(cur, sk, data["drivers"])
+                            n_res = upsert_results(cur, sk, data["session_results"])
+                            n_lap = upsert_laps(cur, sk, data["laps"])
+                            n_stint = upsert_stints(cur, sk, data["stints"])
+                            n_pit = upsert_pits(cur, sk, data["pit"])
+                            n_tel = None
+                            if telemetry:
+                                n_tel = load_session_telemetry(cur, s, [d.get("driver_number") for d in data["drivers"]])
+                            record_watermark(cur, sk, n_drv, n_res, n_lap, n_stint, n_pit, session_finished(s), n_tel)
+                    except (requests.exceptions.RequestException, *DBError) as e:
+                        print(f"    ! session_key={sk} rolled back: {e}")
+                        failed.append(sk)
+                        continue
+                    total_res += n_res
+                    total_lap += n_lap
+                    committer.done(sk if session_finished(s) else None)
+            committer.flush()
     print(f"[{year}] results={total_res}, laps={total_lap}")
+    if failed:
+        print(f"[{year}] {len(failed)} session(s) failed: {failed}")
+    elif year not in live_seasons() and all(session_finished(s) for s in sessions):
+        # a live season can still gain sessions, so it is never closed as a whole
+        checkpoint.mark_done(JOURNAL, year, checkpoint.YEAR)
     return total_res, total_lap
 
-def backfill_range(start_year:int, end_year:int):
+def backfill_range(start_year:int, end_year:int, workers:int=DEFAULT_WORKERS,
+                   full:bool=False, telemetry:bool=False, every:int=DEFAULT_COMMIT_EVERY,
+                   resume:bool=False):
+    years = list(range(start_year, end_year+1))
+    if resume:
+        finished = [y for y in years if checkpoint.year_done(JOURNAL, y)]
+        if finished:
+            print(f"[resume] skipping finished years: {finished}")
+        years = [y for y in years if y not in finished]
+    else:
+        checkpoint.reset(JOURNAL, years)
+    # session lists for every year up front, in parallel
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        calendars = dict(zip(years, pool.map(list_race_sessions, years)))
     grand_r = grand_l = 0
-    for y in range(start_year, end_year+1):
-        r, l = backfill_year(y)
+    for y in years:
+        r, l = backfill_year(y, calendars[y], workers=workers, full=full,
+                             telemetry=telemetry, every=every, resume=resume)
         grand_r += r; grand_l += l
-        time.sleep(1)
     print(f"[ALL {start_year}-{end_year}] results={grand_r:,}, laps={grand_l:,}")
 
 if __name__ == "__main__":
-    start = int(sys.argv[1]) if len(sys.argv)>=2 else 2018
-    end   = int(sys.argv[2]) if len(sys.argv)>=3 else 2025
-    backfill_range(start, end)
+    http_client.offline_from_argv()
+    parser = argparse.ArgumentParser(description="Backfill OpenF1 race sessions into Postgres.")
+    parser.add_argument("start", type=int, nargs="?", default=2018)
+    parser.add_argument("end", type=int, nargs="?", default=2025)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Concurrent API fetches (1 = one request at a time).")
+    parser.add_argument("--full", action="store_true",
+                        help="Reload every session, ignoring the completeness watermarks.")
+    parser.add_argument("--telemetry", action="store_true",
+                        help="Also stream /car_data and /location samples (large).")
+    parser.add_argument("--commit-every", type=commit_every, default=DEFAULT_COMMIT_EVERY,
+                        metavar=COMMIT_CHOICES.replace(" ", ""),
+                        help=f"Transaction size: {COMMIT_CHOICES} (default: race).")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue after the last journaled session instead of starting over.")
+    args = parser.parse_args()
+    backfill_range(args.start, args.end, workers=args.workers, full=args.full,
+                   telemetry=args.telemetry, every=args.commit_every, resume=args.resume)
@@ -1,31 +1,25 @@
 # openf1_loader.py (normalized tables)
-import sys, requests, psycopg2
-from psycopg2.extras import execute_values
+import sys
+from storage import conn, execute_values, upsert
+import http_client
+from openf1_telemetry import load_session_telemetry
+from openf1_schema import ensure_strategy_tables
 
-DB_HOST = "database-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com"
-DB_NAME = "postgres"
-DB_USER = "postgres"
-DB_PASSWORD = "OnePieceReal.7143"
-DB_SSLMODE = "require"
 
 API = "https://api.openf1.org/v1"
 
-def conn():
-    return psycopg2.connect(
-        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
-        port=5432, sslmode=DB_SSLMODE
-    )
+LAP_COLUMNS = ("session_key", "driver_number", "lap_number", "lap_time_ms",
+               "sector1_ms", "sector2_ms", "sector3_ms", "position")
 
 def get(url, params=None):
-    r = requests.get(url, params=params, timeout=60)
-    r.raise_for_status()
-    return r.json()
+    return http_client.get(url, params=params, timeout=60).json()
 
 # ---------- Get Session data ----------
 def upsert_race(cur, session_key:int):
+    """Upsert the session row; returns the OpenF1 session dict (None if unknown)."""
     sess = get(f"{API}/sessions", {"session_key": session_key})
     if not sess:
-        return 0
+        return None
     s = sess[0]
     row = (
         s.get("session_key"),
@@ -50,7 +44,7 @@ def upsert_race(cur, session_key:int):
             date_end     = EXCLUDED.date_end;
     """
     execute_values(cur, sql, [row])
-    return 1
+    return s
 
 # ---------- Get Driver data ----------
 def upsert_drivers_for_session(cur, session_key:int):
@@ -121,32 +115,71 @@ def upsert_laps(cur, session_key:int):
             r.get("s3_duration"),
             r.get("position"),
         ))
+    # COPY into a staging table, then one ON CONFLICT merge into lap_times
+    upsert(cur, "lap_times", LAP_COLUMNS, rows, conflict=("session_key", "driver_number", "lap_number"))
+    return len(rows)
+
+def upsert_stints(cur, session_key:int, stints=None):
+    if stints is None:
+        stints = get(f"{API}/stints", {"session_key": session_key})
+    if not stints:
+        return 0
+    rows = [(r.get("session_key"), r.get("driver_number"), r.get("stint_number"), r.get("lap_start"),
+             r.get("lap_end"), r.get("compound"), r.get("tyre_age_at_start")) for r in stints]
+    sql = """
+        INSERT INTO stints(session_key, driver_number, stint_number, lap_start, lap_end, compound, tyre_age_at_start)
+        VALUES %s
+        ON CONFLICT (session_key, driver_number, stint_number) DO UPDATE
+        SET lap_start         = EXCLUDED.lap_start,
+            lap_end           = EXCLUDED.lap_end,
+            compound          = EXCLUDED.compound,
+            tyre_age_at_start = EXCLUDED.tyre_age_at_start;
+    """
+    # whole session in one statement
+    execute_values(cur, sql, rows, page_size=len(rows))
+    return len(rows)
+
+def upsert_pits(cur, session_key:int, pits=None):
+    if pits is None:
+        pits = get(f"{API}/pit", {"session_key": session_key})
+    if not pits:
+        return 0
+    rows = [(r.get("session_key"), r.get("driver_number"), r.get("lap_number"), r.get("pit_duration"),
+             r.get("date")) for r in pits]
     sql = """
-        INSERT INTO lap_times(session_key, driver_number, lap_number, lap_time_ms, sector1_ms, sector2_ms, sector3_ms, position)
+        INSERT INTO pit_stops(session_key, driver_number, lap_number, pit_duration, date)
         VALUES %s
         ON CONFLICT (session_key, driver_number, lap_number) DO UPDATE
-        SET lap_time_ms = EXCLUDED.lap_time_ms,
-            sector1_ms  = EXCLUDED.sector1_ms,
-            sector2_ms  = EXCLUDED.sector2_ms,
-            sector3_ms  = EXCLUDED.sector3_ms,
-            position    = EXCLUDED.position;
+        SET pit_duration = EXCLUDED.pit_duration,
+            date         = EXCLUDED.date;
     """
-    execute_values(cur, sql, rows)
+    execute_values(cur, sql, rows, page_size=len(rows))
     return len(rows)
 
 def main():
+    http_client.offline_from_argv()
+    telemetry = "--telemetry" in sys.argv
+    if telemetry:
+        sys.argv.remove("--telemetry")
     if len(sys.argv) != 2:
-        print("Usage: python openf1_loader.py <SESSION_KEY>")
+        print("Usage: python openf1_loader.py <SESSION_KEY> [--telemetry] [--offline]")
         sys.exit(1)
     sk = int(sys.argv[1])
-    with conn() as connection:
+    n_tel = 0
+    with conn("openf1") as connection:
         with connection.cursor() as cur:
-            upsert_race(cur, sk)
+            session = upsert_race(cur, sk)
             upsert_drivers_for_session(cur, sk)
             n_res = upsert_results(cur, sk)
             n_lap = upsert_laps(cur, sk)
+            ensure_strategy_tables(cur)
+            n_stint = upsert_stints(cur, sk)
+            n_pit = upsert_pits(cur, sk)
+            if telemetry and session:
+                n_tel = load_session_telemetry(cur, session)
         connection.commit()
-    print(f"Loaded session_key={sk}: results={n_res}, laps={n_lap}")
+    print(f"Loaded session_key={sk}: results={n_res}, laps={n_lap}, stints={n_stint}, "
+          f"pit_stops={n_pit}, telemetry={n_tel}")
 
 if __name__ == "__main__":
     main()
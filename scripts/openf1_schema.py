@@ -0,0 +1,35 @@
+# openf1_schema.py
+# DDL for the tyre-strategy tables shared by openf1-loader.py and openf1-backfill.py.
+#
+# Stints are joined to lap_times on
+#   (session_key, driver_number) AND lap_number BETWEEN lap_start AND lap_end
+# lap_times is already covered by its (session_key, driver_number, lap_number)
+# conflict key; stints get a matching (session_key, driver_number, lap_start,
+# lap_end) index so the range join is an index scan on both sides.
+# (SQLite storage gets the same tables from sql/sqlite/openf1.sql.)
+from storage import ddl
+
+
+def ensure_strategy_tables(cur):
+    ddl(cur, """
+        CREATE TABLE IF NOT EXISTS stints (
+            session_key       INTEGER NOT NULL,
+            driver_number     INTEGER NOT NULL,
+            stint_number      SMALLINT NOT NULL,
+            lap_start         SMALLINT,
+            lap_end           SMALLINT,
+            compound          TEXT,
+            tyre_age_at_start SMALLINT,
+            PRIMARY KEY (session_key, driver_number, stint_number)
+        );
+        CREATE INDEX IF NOT EXISTS stints_session_driver_laps
+            ON stints (session_key, driver_number, lap_start, lap_end) INCLUDE (compound, tyre_age_at_start);
+        CREATE TABLE IF NOT EXISTS pit_stops (
+            session_key   INTEGER NOT NULL,
+            driver_number INTEGER NOT NULL,
+            lap_number    SMALLINT NOT NULL,
+            pit_duration  REAL,
+            date          TIMESTAMPTZ,
+            PRIMARY KEY (session_key, driver_number, lap_number)
+        );
+    """)
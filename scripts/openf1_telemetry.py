@@ -0,0 +1,135 @@
+# openf1_telemetry.py
+# Chunked, streaming ingestion of OpenF1 /car_data and /location.
+#
+# A race is millions of samples, so nothing here ever holds a whole session:
+# each (endpoint, driver) is pulled in fixed time windows, a couple of windows
+# are prefetched on worker threads, and every window is COPY'd into Postgres
+# as soon as it arrives (executemany on the SQLite storage backend). Memory
+# stays at O(window) no matter the session size.
+# Shared by openf1-loader.py and openf1-backfill.py.
+import csv
+import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+import http_client
+from storage import ddl, dialect
+
+API = "https://api.openf1.org/v1"
+WINDOW = timedelta(minutes=10)    # one request per driver per window
+END_PADDING = timedelta(minutes=30)   # sessions overrun their scheduled end (red flags)
+PREFETCH = 3                      # windows in flight ahead of the writer
+
+# endpoint -> (table, columns)
+TELEMETRY = {
+    "car_data": ("car_data", ("session_key", "driver_number", "date", "rpm", "speed",
+                              "n_gear", "throttle", "brake", "drs")),
+    "location": ("car_location", ("session_key", "driver_number", "date", "x", "y", "z")),
+}
+
+
+def ensure_telemetry_tables(cur):
+    ddl(cur, """
+        CREATE TABLE IF NOT EXISTS car_data (
+            session_key   INTEGER NOT NULL,
+            driver_number INTEGER NOT NULL,
+            date          TIMESTAMPTZ NOT NULL,
+            rpm           INTEGER,
+            speed         SMALLINT,
+            n_gear        SMALLINT,
+            throttle      SMALLINT,
+            brake         SMALLINT,
+            drs           SMALLINT
+        );
+        CREATE INDEX IF NOT EXISTS car_data_session_driver_date
+            ON car_data (session_key, driver_number, date);
+        CREATE TABLE IF NOT EXISTS car_location (
+            session_key   INTEGER NOT NULL,
+            driver_number INTEGER NOT NULL,
+            date          TIMESTAMPTZ NOT NULL,
+            x             INTEGER,
+            y             INTEGER,
+            z             INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS car_location_session_driver_date
+            ON car_location (session_key, driver_number, date);
+    """)
+
+
+def time_windows(start, end, step=WINDOW):
+    lo = start
+    while lo < end:
+        hi = min(lo + step, end)
+        yield lo, hi
+        lo = hi
+
+
+def _parse_ts(value):
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def fetch_window(endpoint, session_key, driver_number, lo, hi):
+    url = (f"{API}/{endpoint}?session_key={session_key}&driver_number={driver_number}"
+           f"&date>={quote(lo.isoformat())}&date<{quote(hi.isoformat())}")
+    return http_client.get(url, timeout=60).json()
+
+
+def iter_windows(endpoint, session_key, driver_number, start, end):
+    """Yield the rows of each time window in order, keeping PREFETCH requests in flight."""
+    with ThreadPoolExecutor(max_workers=PREFETCH) as pool:
+        pending = deque()
+        for lo, hi in time_windows(start, end):
+            pending.append(pool.submit(fetch_window, endpoint, session_key, driver_number, lo, hi))
+            if len(pending) >= PREFETCH:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def copy_rows(cur, table, columns, rows):
+    """COPY one chunk of API rows (dicts) into `table`."""
+    if dialect(cur) == "sqlite":
+        cur.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                        [[r.get(c) for c in columns] for r in rows])
+        return len(rows)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for r in rows:
+        writer.writerow(["" if r.get(c) is None else r.get(c) for c in columns])
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    return len(rows)
+
+
+def load_session_telemetry(cur, session, driver_numbers=None, endpoints=tuple(TELEMETRY)):
+    """
+    Stream car_data/location for one session into the database.
+
+    session: OpenF1 session dict (needs session_key, date_start, date_end).
+    driver_numbers: drivers to load; fetched from /drivers when omitted.
+    Existing rows for each (session, driver) are replaced so reruns are idempotent.
+    Returns the number of samples written.
+    """
+    sk = session.get("session_key")
+    if driver_numbers is None:
+        drivers = http_client.get(f"{API}/drivers", params={"session_key": sk}, timeout=60).json()
+        driver_numbers = [d.get("driver_number") for d in drivers]
+    start = _parse_ts(session["date_start"])
+    end = _parse_ts(session["date_end"]) + END_PADDING
+
+    ensure_telemetry_tables(cur)
+    total = 0
+    for endpoint in endpoints:
+        table, columns = TELEMETRY[endpoint]
+        for dn in sorted(set(driver_numbers)):
+            cur.execute(f"DELETE FROM {table} WHERE session_key = %s AND driver_number = %s", (sk, dn))
+            n = 0
+            for rows in iter_windows(endpoint, sk, dn, start, end):
+                if rows:
+                    n += copy_rows(cur, table, columns, rows)
+            total += n
+        print(f"    {endpoint}: {total:,} samples so far")
+    return total
@@ -0,0 +1,126 @@
+# page_archive.py
+# Permanent, content-addressed archive of every page/payload we fetch.
+#
+# Layout (under data/archive/):
+#   objects/ab/abcdef....gz   gzip-compressed body, named by sha256 of the raw bytes
+#   index.sqlite              fetches(url, fetched_at, sha256, status, content_type, encoding)
+#
+# Identical bodies are stored once no matter how often they are fetched; the
+# index keeps one row per fetch so the history of a URL is preserved. With
+# http_client in offline mode, the latest archived copy of a URL is replayed
+# instead of touching the network, so parsers can be re-run over the whole
+# history at disk speed.
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "archive")
+
+_lock = threading.Lock()
+_db = None
+
+
+def _index():
+    global _db
+    if _db is None:
+        os.makedirs(os.path.join(ARCHIVE_DIR, "objects"), exist_ok=True)
+        _db = sqlite3.connect(os.path.join(ARCHIVE_DIR, "index.sqlite"), check_same_thread=False)
+        _db.execute("""
+            CREATE TABLE IF NOT EXISTS fetches (
+                url          TEXT NOT NULL,
+                fetched_at   TEXT NOT NULL,
+                sha256       TEXT NOT NULL,
+                status       INTEGER,
+                content_type TEXT,
+                encoding     TEXT
+            )""")
+        _db.execute("CREATE INDEX IF NOT EXISTS fetches_url_time ON fetches (url, fetched_at)")
+        _db.commit()
+    return _db
+
+
+def object_path(sha):
+    return os.path.join(ARCHIVE_DIR, "objects", sha[:2], f"{sha}.gz")
+
+
+def store(url, content: bytes, status=200, content_type=None, encoding=None, fetched_at=None):
+    """Archive one fetched body under `url`; returns its sha256."""
+    sha = hashlib.sha256(content).hexdigest()
+    path = object_path(sha)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(gzip.compress(content))
+        os.replace(tmp, path)
+    fetched_at = fetched_at or datetime.now(timezone.utc).isoformat()
+    with _lock:
+        db = _index()
+        db.execute("INSERT INTO fetches VALUES (?, ?, ?, ?, ?, ?)",
+                   (url, fetched_at, sha, status, content_type, encoding))
+        db.commit()
+    return sha
+
+
+def load(sha) -> bytes:
+    with open(object_path(sha), "rb") as f:
+        return gzip.decompress(f.read())
+
+
+def has(url):
+    with _lock:
+        return _index().execute("SELECT 1 FROM fetches WHERE url = ? LIMIT 1", (url,)).fetchone() is not None
+
+
+def latest_entry(url):
+    """(sha256, fetched_at, status, content_type, encoding) of the newest fetch of url, or None."""
+    with _lock:
+        return _index().execute("""
+            SELECT sha256, fetched_at, status, content_type, encoding
+            FROM fetches WHERE url = ? ORDER BY fetched_at DESC LIMIT 1""", (url,)).fetchone()
+
+
+def iter_latest(url_like="%"):
+    """Yield (url, sha256, fetched_at) for the newest fetch of every URL matching a SQL LIKE pattern."""
+    with _lock:
+        rows = _index().execute("""
+            SELECT url, sha256, MAX(fetched_at) FROM fetches
+            WHERE url LIKE ? GROUP BY url ORDER BY url""", (url_like,)).fetchall()
+    yield from rows
+
+
+class ArchivedResponse:
+    """Just enough of requests.Response for the scrapers to parse an archived page."""
+
+    from_cache = True
+
+    def __init__(self, url, content, status_code=200, content_type=None, encoding=None, fetched_at=None):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = {"Content-Type": content_type} if content_type else {}
+        self.encoding = encoding or "utf-8"
+        self.fetched_at = fetched_at
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+
+def latest(url):
+    """Newest archived copy of url as an ArchivedResponse, or None if never archived."""
+    entry = latest_entry(url)
+    if entry is None:
+        return None
+    sha, fetched_at, status, content_type, encoding = entry
+    return ArchivedResponse(url, load(sha), status, content_type, encoding, fetched_at)
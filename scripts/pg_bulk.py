@@ -0,0 +1,111 @@
+# pg_bulk.py
+# COPY-based bulk upserts for Postgres.
+#
+# Instead of execute_values (one INSERT round trip per page of 100 rows), a
+# batch is COPY'd into a temporary staging table in a single stream and then
+# merged into the target with one INSERT ... SELECT ... ON CONFLICT DO UPDATE.
+# Works for any table / conflict key; the staging table only lives until the
+# end of the transaction.
+#
+# The DO UPDATE only fires for rows whose values actually differ
+# (IS DISTINCT FROM), so re-loading unchanged data writes no new row versions,
+# fires no triggers and creates no WAL. STATS tallies changed vs. unchanged
+# rows per table for the end-of-run report.
+import csv
+import io
+import threading
+from collections import defaultdict
+
+NULL = r"\N"
+
+STATS = defaultdict(lambda: [0, 0])    # table -> [changed, unchanged]
+_stats_lock = threading.Lock()
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _csv_value(v):
+    if v is None or (isinstance(v, float) and v != v):   # None / NaN -> NULL
+        return NULL
+    return v
+
+
+def dedupe(rows, key_idx):
+    """Keep the first row for every conflict key (ON CONFLICT can't touch a row twice)."""
+    seen = set()
+    out = []
+    for r in rows:
+        k = tuple(r[i] for i in key_idx)
+        if k not in seen:
+            seen.add(k)
+            out.append(r)
+    return out
+
+
+def copy_upsert(cur, table, columns, rows, conflict, update=None):
+    """
+    Upsert `rows` (tuples in `columns` order) into `table` via COPY + one merge.
+
+    conflict: column names of the target's unique key.
+    update:   columns to overwrite on conflict (default: every non-key column;
+              an empty list means DO NOTHING).
+    Rows identical to what is already stored are skipped, not rewritten.
+    Returns the number of rows actually inserted or updated.
+    """
+    columns = list(columns)
+    rows = dedupe(rows, [columns.index(c) for c in conflict])
+    if not rows:
+        return 0
+    if update is None:
+        update = [c for c in columns if c not in conflict]
+
+    stage = _quote(f"_stage_{table}")
+    cols = ", ".join(_quote(c) for c in columns)
+    cur.execute(f"DROP TABLE IF EXISTS {stage}")
+    cur.execute(f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS "
+                f"SELECT {cols} FROM {table} WITH NO DATA")
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for r in rows:
+        writer.writerow([_csv_value(v) for v in r])
+    buf.seek(0)
+    cur.copy_expert(f"COPY {stage} ({cols}) FROM STDIN WITH (FORMAT csv, NULL '{NULL}')", buf)
+
+    if update:
+        action = ("DO UPDATE SET " + ", ".join(f"{_quote(c)} = EXCLUDED.{_quote(c)}" for c in update)
+                  + f" WHERE ({', '.join(f'{table}.{_quote(c)}' for c in update)})"
+                  + f" IS DISTINCT FROM ({', '.join(f'EXCLUDED.{_quote(c)}' for c in update)})")
+    else:
+        action = "DO NOTHING"
+    cur.execute(f"""
+        INSERT INTO {table} ({cols})
+        SELECT {cols} FROM {stage}
+        ON CONFLICT ({", ".join(_quote(c) for c in conflict)}) {action};
+    """)
+    changed = cur.rowcount
+    tally(table, changed, len(rows))
+    return changed
+
+
+def tally(table, changed, total):
+    """Count `changed` of `total` upserted rows of `table` for report_stats()."""
+    with _stats_lock:
+        STATS[table][0] += changed
+        STATS[table][1] += total - changed
+
+
+def report_stats(reset=True):
+    """Print rows changed vs. skipped as unchanged for every table touched so far."""
+    with _stats_lock:
+        for table, (changed, unchanged) in sorted(STATS.items()):
+            print(f"  {table}: {changed} rows changed, {unchanged} unchanged")
+        if reset:
+            STATS.clear()
+
+
+def copy_upsert_df(cur, df, table, conflict, update=None):
+    """copy_upsert for a DataFrame whose column names match the table."""
+    return copy_upsert(cur, table, list(df.columns), df.itertuples(index=False, name=None), conflict, update)
@@ -0,0 +1,87 @@
+# pipeline.py
+# Overlapped fetch -> parse -> write pipeline with bounded queues.
+#
+#   items ──> [fetch workers] ──q──> [parse workers] ──q──> writer (caller's thread)
+#
+# Network waits, parsing and DB round trips run at the same time instead of
+# one race after the other. The queues between stages are bounded, so a slow
+# writer pushes back on the parsers and fetchers and memory stays flat. The
+# writer gets parsed results in batches so it can write several races per
+# statement. A failed fetch/parse only drops that item.
+import queue
+import threading
+
+_DONE = object()
+
+
+def _fetch_worker(items, fetch, out_q, errors):
+    while True:
+        try:
+            item = items.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            out_q.put((item, fetch(item)))
+        except Exception as e:
+            errors.append((item, e))
+            print(f"    ! fetch failed for {item}: {e}")
+
+
+def _parse_worker(in_q, parse, out_q, errors):
+    while True:
+        got = in_q.get()
+        if got is _DONE:
+            return
+        item, fetched = got
+        try:
+            out_q.put((item, parse(item, fetched)))
+        except Exception as e:
+            errors.append((item, e))
+            print(f"    ! parse failed for {item}: {e}")
+
+
+def _close_after(threads, q, n_sentinels):
+    for t in threads:
+        t.join()
+    for _ in range(n_sentinels):
+        q.put(_DONE)
+
+
+def _start(target, *args):
+    t = threading.Thread(target=target, args=args, daemon=True)
+    t.start()
+    return t
+
+
+def run_pipeline(items, fetch, parse, write, fetch_workers=4, parse_workers=2, queue_size=8, batch_size=1):
+    """
+    Push every item through fetch(item) -> parse(item, fetched) -> write(batch).
+
+    write receives lists of (item, parsed) of up to batch_size entries and runs
+    in the calling thread (so it can use the caller's DB cursor).
+    Returns the list of (item, exception) for items that failed to fetch/parse.
+    """
+    todo = queue.Queue()
+    for it in items:
+        todo.put(it)
+    fetched_q = queue.Queue(maxsize=queue_size)
+    parsed_q = queue.Queue(maxsize=queue_size)
+    errors = []
+
+    fetchers = [_start(_fetch_worker, todo, fetch, fetched_q, errors) for _ in range(max(1, fetch_workers))]
+    parsers = [_start(_parse_worker, fetched_q, parse, parsed_q, errors) for _ in range(max(1, parse_workers))]
+    _start(_close_after, fetchers, fetched_q, len(parsers))
+    _start(_close_after, parsers, parsed_q, 1)
+
+    batch = []
+    while True:
+        got = parsed_q.get()
+        if got is _DONE:
+            break
+        batch.append(got)
+        if len(batch) >= batch_size:
+            write(batch)
+            batch = []
+    if batch:
+        write(batch)
+    return errors
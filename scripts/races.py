@@ -1,87 +1,50 @@
 # A dynamic script to access multiple Formula 1 race result pages.
 # This script uses a function to make it reusable for different years.
 
-import requests
-import time
-from bs4 import BeautifulSoup
+import http_client
+import table_parser
 import pandas as pd
 import re
-import requests_cache
-import psycopg2
-from psycopg2.extras import execute_values
+from storage import conn, upsert_df
 import unicodedata
 from datetime import datetime
-from psycopg2 import extras
-import random
-
-# My DB and Session configurations
-DB_HOST = "database-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com"
-DB_NAME = "postgres"
-DB_USER = "postgres"
-DB_PASSWORD = "OnePieceReal.7143"
-DB_SSLMODE = "require"
-BASE = "https://www.formula1.com"
 
-def conn():
-    return psycopg2.connect(
-        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
-        port=5432, sslmode=DB_SSLMODE
-    )
+BASE = "https://www.formula1.com"
 
 def parse_year_data(response, year):
-    soup = BeautifulSoup(response.text, 'lxml')
-    
     all_race_data = []
     
-    # Find the first main tag on the page.
-    main_content_div = soup.find('main')
-                    
-    if main_content_div:
-        # Find the first table within that main tag.
-        table = main_content_div.find('table')
-                        
-        if table:
-            # Find the table headers to use as DataFrame columns.
-            headers = [th.text.strip() for th in table.find_all('th')]
-                            
-            # Find all table rows (tr) within the table body (tbody).
-            table_body = table.find('tbody')
-            rows = table_body.find_all('tr')
-                            
-            # Iterate over the rows and extract the data from each cell.
-            for row in rows:
-                cells = row.find_all('td')
-                row_data = [cell.text.strip() for cell in cells]
-                
-                # Check for empty strings in data and replace with None for database compatibility
-                row_data = [None if x == '' else x for x in row_data]
-                                
-                # Find the <a> tag inside the Grand Prix cell to get the link
-                grand_prix_cell = row.find('td')
-                if grand_prix_cell:
-                    grand_prix_link = grand_prix_cell.find('a', href=True)
-                    if grand_prix_link:
-                        row_data.append(grand_prix_link.get('href'))
-                    else:
-                        row_data.append(None) # Add a None if no link is found
-                else:
-                    row_data.append(None) # Add a None if no Grand Prix cell is found
-                                
-                # Add the year to each row of data for context.
-                row_data.append(year)
-                all_race_data.append(row_data)
-
-            # Add 'Year' to the headers list so it's a column in the DataFrame
-            headers.append('Race Link')
-            headers.append('Year')
-            
-            return pd.DataFrame(all_race_data, columns=headers)
-        else:
-            print(f"Could not find a table within the main content div for {year}.")
+    # Parse only the page's main block and take the first table within it.
+    tables = table_parser.tables(table_parser.parse_main(response.text))
 
-    else:
-        print(f"Could not find the main content div for {year}.")
-    
+    if tables:
+        table = tables[0]
+
+        # Find the table headers to use as DataFrame columns.
+        headers = [table_parser.text(th).strip() for th in table_parser.head_cells(table)]
+
+        # Iterate over the body rows and extract the data from each cell.
+        for row in table_parser.body_rows(table):
+            cells = table_parser.cells(row)
+            row_data = [table_parser.text(cell).strip() for cell in cells]
+
+            # Check for empty strings in data and replace with None for database compatibility
+            row_data = [None if x == '' else x for x in row_data]
+
+            # The link inside the Grand Prix cell (None if there is no cell or no link)
+            row_data.append(table_parser.first_link(cells[0]) if cells else None)
+
+            # Add the year to each row of data for context.
+            row_data.append(year)
+            all_race_data.append(row_data)
+
+        # Add 'Year' to the headers list so it's a column in the DataFrame
+        headers.append('Race Link')
+        headers.append('Year')
+
+        return pd.DataFrame(all_race_data, columns=headers)
+
+    print(f"Could not find a table within the main content for {year}.")
     return pd.DataFrame()
 
 
@@ -103,10 +66,8 @@ def scrape_f1_races(start_year: int, end_year: int):
     
         try:
             # Send a GET request with a timeout.
-            response = requests.get(url, timeout=10)
-            
-            # Raise an exception for bad status codes (4xx or 5xx).
-            response.raise_for_status()
+            # Raises an exception for bad status codes (4xx or 5xx).
+            response = http_client.get(url, timeout=10)
             
             print(f"Request successful! Status Code: {response.status_code}")
             
@@ -120,47 +81,23 @@ def scrape_f1_races(start_year: int, end_year: int):
                 
         except Exception as e:
             print(f"[{year}] Error: {e}")
-        
-        # Add a small delay between requests to be polite to the server.
-        time.sleep(random.randint(3,10))
 
 def upsert_to_psql(df, table_name):
     """
     Upserts DataFrame records into a PostgreSQL table.
     """
-    with conn() as connection:
+    with conn("f1com") as connection:
         with connection.cursor() as cur:
 
-            # Convert DataFrame to a list of tuples for bulk insertion
-            df_tuples = [tuple(row) for row in df.itertuples(index=False)]
-
-            # Dynamically create the column list for the SQL query
-            columns = ', '.join(f'"{col}"' for col in df.columns)
-            
             # Define the primary key for the ON CONFLICT clause
             # Assuming a composite key of (year, grand_prix)
-            conflict_target = '(year, grand_prix)'
-            
-            # Define the update columns for the ON CONFLICT clause
-            update_columns = ', '.join(f'"{col}" = EXCLUDED."{col}"' for col in df.columns if col not in ['year', 'grand_prix'])
-
-            upsert_query = f"""
-            INSERT INTO {table_name} ({columns})
-            VALUES %s
-            ON CONFLICT {conflict_target} DO UPDATE SET
-            {update_columns};
-            """
-            
-            # Execute the upsert using execute_values for efficiency
-            extras.execute_values(
-                cur,
-                upsert_query,
-                df_tuples,
-                page_size=100
-            )
-            
+            conflict_target = ('year', 'grand_prix')
+
+            # COPY into a staging table + one merge (updates every non-key column)
+            n = upsert_df(cur, df, table_name, conflict_target)
+
             connection.commit()
-            print(f"Successfully upserted {len(df_tuples)} rows into {table_name}.")
+            print(f"Successfully upserted {n} rows into {table_name}.")
 
     
 def clean_race_data(df):
@@ -221,11 +158,12 @@ def clean_race_data(df):
 
 if __name__ == "__main__":
     import sys
+    http_client.offline_from_argv()
     if len(sys.argv) == 3:
         s, e = int(sys.argv[1]), int(sys.argv[2])
     elif len(sys.argv) == 2:
         s = e = int(sys.argv[1])
     else:
-        print("Usage: python scrape_races.py <YEAR> [<END_YEAR>]")
+        print("Usage: python scrape_races.py <YEAR> [<END_YEAR>] [--offline]")
         sys.exit(1)
     scrape_f1_races(s, e)
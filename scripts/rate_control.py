@@ -0,0 +1,121 @@
+# rate_control.py
+# Adaptive per-host pacing for the shared HTTP client.
+#
+# Replaces the fixed random sleeps the scrapers used to do. Each host gets its
+# own limiter that spaces out request starts and adapts the pace (AIMD):
+#   * 429 / 503        -> halve the request rate and honour Retry-After
+#   * other 5xx, errors -> back off by a smaller factor
+#   * slow responses    -> ease off a little
+#   * fast 2xx/3xx/4xx  -> creep the rate back up towards the host's ceiling
+# Only requests that actually hit the network pass through here; cache hits
+# and offline replays never wait.
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+THROTTLE_STATUSES = (429, 503)
+SLOW_LATENCY = 3.0      # seconds; slower responses mean the server is struggling
+MAX_THROTTLE_RETRIES = 3
+
+
+class HostLimiter:
+    """Pacing state for one host: `interval` seconds between request starts."""
+
+    def __init__(self, host, start, minimum, maximum, step=0.05):
+        self.host = host
+        self.interval = start
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step          # additive rate increase (req/s) per good response
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until this host may receive another request."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def _set_rate(self, rate):
+        self.interval = min(self.maximum, max(self.minimum, 1.0 / rate))
+
+    def observe(self, status, latency, retry_after=None):
+        """Adapt the pace from one response (status None means a connection error)."""
+        with self._lock:
+            rate = 1.0 / self.interval
+            if status in THROTTLE_STATUSES:
+                self._set_rate(rate / 2)
+                if retry_after:
+                    self._next = max(self._next, time.monotonic() + retry_after)
+                print(f"[rate] {self.host} throttled ({status}), "
+                      f"now 1 req / {self.interval:.2f}s")
+            elif status is None or status >= 500:
+                self._set_rate(rate / 1.5)
+            elif latency > SLOW_LATENCY:
+                self._set_rate(rate / 1.25)
+            else:
+                self._set_rate(rate + self.step)
+
+
+# host -> (start interval, min interval, max interval) in seconds
+HOST_LIMITS = {
+    "www.formula1.com": (5.0, 2.0, 60.0),
+    "api.openf1.org":   (0.5, 0.25, 30.0),
+    "ergast.com":       (0.5, 0.25, 30.0),
+}
+DEFAULT_LIMITS = (1.0, 0.5, 30.0)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(host):
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = HostLimiter(host, *HOST_LIMITS.get(host, DEFAULT_LIMITS))
+        return _limiters[host]
+
+
+def parse_retry_after(value):
+    """Retry-After header (delta-seconds or HTTP date) -> seconds to wait, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class ThrottledAdapter(HTTPAdapter):
+    """HTTPAdapter that paces every outgoing request through its host's limiter."""
+
+    def send(self, request, **kwargs):
+        limiter = limiter_for(urlsplit(request.url).hostname)
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            limiter.acquire()
+            t0 = time.monotonic()
+            try:
+                resp = super().send(request, **kwargs)
+            except Exception:
+                limiter.observe(None, time.monotonic() - t0)
+                raise
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            limiter.observe(resp.status_code, time.monotonic() - t0, retry_after)
+            if resp.status_code not in THROTTLE_STATUSES or attempt == MAX_THROTTLE_RETRIES:
+                return resp
+            resp.close()
+        return resp
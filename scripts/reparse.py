@@ -0,0 +1,179 @@
+# reparse.py
+# Re-parse archived formula1.com pages on every core and rewrite their rows.
+#
+#   python reparse.py legacy 2015 2024          # f1_results_scraper -> legacy_races / legacy_results
+#   python reparse.py results 2015 2024         # results.py         -> results
+#   python reparse.py starting_grid 2015 2024   # starting_grid.py   -> starting_grid
+#   options: --workers N (default: all cores) --chunk N --batch N --dry-run
+#
+# Parsing and cleaning are CPU-bound, so the online scrapers' parse threads
+# share one core. Here pages come from the page archive (http_client offline
+# mode, see page_archive.py) and are spread over a ProcessPoolExecutor in
+# chunks of --chunk pages. Each worker reads its pages from disk itself and
+# returns plain tuples (page sha, row tuples) instead of DataFrames, so only
+# small pickles cross the process boundary. The main process merges them and
+# writes --batch races per upsert (one savepoint each, race by race on
+# failure), recording page fingerprints like the scrapers do. Every page is
+# rewritten, as with --force; rows that come out identical are still skipped
+# by the upsert guards.
+import argparse
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+import http_client
+import page_archive
+import f1_results_scraper
+import results
+import starting_grid
+from change_detect import ensure_fingerprint_table, page_fingerprint, record_fingerprints, rows_fingerprint
+from db import savepoint
+from pg_bulk import report_stats
+from storage import conn, upsert, Error as DBError
+
+RESULTS_KEY = ("year", "grand_prix", "car_number")
+GRID_KEY = ("year", "grand_prix", "pos")
+
+
+# --- work items: (key, args) per page, built in the main process ---
+def legacy_items(years):
+    items = []
+    for year in years:
+        index = page_archive.latest(f1_results_scraper.year_index_urls(year)[0])
+        if index is None:
+            print(f"[{year}] season index not archived, skipped")
+            continue
+        items += [(race["result_url"], (year, race)) for race in f1_results_scraper.parse_year_index(year, index.text)]
+    return items
+
+
+def race_link_items(module, years):
+    return [(link, (year, link, grand_prix))
+            for year, link, grand_prix in module.get_race_links_from_psql(years[0], years[-1])]
+
+
+# --- workers (run in the pool; return compact tuples) ---
+def parse_legacy(year, race):
+    html = http_client.get(race["result_url"]).text
+    meta, rows = f1_results_scraper.parse_race_result_page(race["result_url"], html)
+    race_row, payload = f1_results_scraper.build_race_rows(year, race, meta, rows)
+    return rows_fingerprint(race_row, payload), race_row, payload    # as f1_results_scraper.scrape_year
+
+
+def parse_results(year, link, grand_prix):
+    html = http_client.get(link, timeout=10).text
+    df = results.clean_race_details(results.scrape_race_details(link, year, grand_prix, html))
+    if df.empty:
+        raise ValueError("no results table")
+    return page_fingerprint(html), tuple(df.columns), list(df.itertuples(index=False, name=None))
+
+
+def parse_starting_grid(year, link, grand_prix):
+    df = starting_grid.scrape_starting_grid(link.replace("race-result", "starting-grid"), year, grand_prix)
+    df = starting_grid.clean_dataframe(df)
+    if df.empty:
+        raise ValueError("no starting grid table")
+    return None, tuple(df.columns), list(df.itertuples(index=False, name=None))
+
+
+def _init_worker():
+    page_archive._db = None        # the parent's SQLite handle must not be shared across fork
+    http_client.set_offline(True)
+
+
+def _parse_chunk(parse, chunk):
+    """[(key, True, parsed) | (key, False, error text)] for one chunk of pages."""
+    out = []
+    for key, args in chunk:
+        try:
+            with redirect_stdout(io.StringIO()):      # the scrapers print per page
+                out.append((key, True, parse(*args)))
+        except Exception as e:
+            out.append((key, False, f"{type(e).__name__}: {e}"))
+    return out
+
+
+# --- writers (main process) ---
+def write_legacy(cur, batch):
+    """batch: [(key, (sha, race_row, payload))] -- one upsert per table"""
+    f1_results_scraper.upsert_legacy_races(cur, [race_row for _, (_, race_row, _) in batch])
+    rows = [r for _, (_, _, payload) in batch for r in payload]
+    if rows:
+        f1_results_scraper.upsert_legacy_results(cur, rows)
+    record_fingerprints(cur, {key: sha for key, (sha, _, _) in batch})
+
+
+def table_writer(table, conflict):
+    def write(cur, batch):
+        """batch: [(key, (sha, columns, rows))]"""
+        rows = [r for _, (_, _, race_rows) in batch for r in race_rows]
+        if rows:
+            upsert(cur, table, batch[0][1][1], rows, conflict)
+        shas = {key: sha for key, (sha, _, _) in batch if sha}
+        if shas:
+            record_fingerprints(cur, shas)
+    return write
+
+
+JOBS = {
+    "legacy": (legacy_items, parse_legacy, write_legacy),
+    "results": (lambda years: race_link_items(results, years), parse_results, table_writer("results", RESULTS_KEY)),
+    "starting_grid": (lambda years: race_link_items(starting_grid, years), parse_starting_grid,
+                      table_writer("starting_grid", GRID_KEY)),
+}
+
+
+def reparse(job, start, end, workers=None, chunk=8, batch=20, dry_run=False):
+    make_items, parse, write = JOBS[job]
+    http_client.set_offline(True)
+    items = make_items(list(range(start, end + 1)))
+    chunks = [items[i:i + chunk] for i in range(0, len(items), chunk)]
+    workers = workers or os.cpu_count()
+    print(f"[{job}] {len(items)} archived page(s) in {len(chunks)} chunk(s) on {workers} process(es)")
+
+    parsed, failed = [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for out in pool.map(_parse_chunk, [parse] * len(chunks), chunks):
+            for key, ok, value in out:
+                (parsed if ok else failed).append((key, value))
+    for key, error in failed:
+        print(f"    ! {key}: {error}")
+    print(f"[{job}] parsed {len(parsed)} page(s), {len(failed)} failed")
+    if dry_run or not parsed:
+        return parsed, failed
+
+    bad = 0
+    with conn("f1com") as connection:
+        with connection.cursor() as cur:
+            ensure_fingerprint_table(cur)
+            for i in range(0, len(parsed), batch):
+                group = parsed[i:i + batch]
+                try:
+                    with savepoint(cur, "batch"):
+                        write(cur, group)
+                except DBError:
+                    for one in group:
+                        try:
+                            with savepoint(cur, "race"):
+                                write(cur, [one])
+                        except DBError as e:
+                            bad += 1
+                            print(f"    ! {one[0]} rolled back: {e}")
+    print(f"[{job}] wrote {len(parsed) - bad} page(s)")
+    report_stats()
+    return parsed, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-parse archived pages on all cores and rewrite their rows.")
+    parser.add_argument("job", choices=sorted(JOBS))
+    parser.add_argument("start", type=int)
+    parser.add_argument("end", type=int, nargs="?")
+    parser.add_argument("--workers", type=int, help="Parser processes (default: all cores).")
+    parser.add_argument("--chunk", type=int, default=8, help="Pages per task sent to a worker.")
+    parser.add_argument("--batch", type=int, default=20, help="Races per upsert.")
+    parser.add_argument("--dry-run", action="store_true", help="Parse only, write nothing.")
+    args = parser.parse_args()
+    reparse(args.job, args.start, args.end or args.start, workers=args.workers, chunk=args.chunk,
+            batch=args.batch, dry_run=args.dry_run)
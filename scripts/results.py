@@ -1,26 +1,16 @@
 import requests
-import time
+import http_client
+import table_parser
+import checkpoint
 import sys
 import pandas as pd
-from bs4 import BeautifulSoup
-import psycopg2
-from psycopg2 import extras
-import random
+from db import savepoint, Committer, commit_every
+from storage import conn, upsert_df, Error as DBError
+from pg_bulk import report_stats
+from change_detect import ensure_fingerprint_table, load_fingerprints, page_fingerprint, record_fingerprints
+from pipeline import run_pipeline
 import numpy as np
 
-# My DB and Session configurations
-DB_HOST = "database-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com"
-DB_NAME = "postgres"
-DB_USER = "postgres"
-DB_PASSWORD = "OnePieceReal.7143"
-DB_SSLMODE = "require"
-
-def conn():
-    """Establishes a connection to the PostgreSQL database."""
-    return psycopg2.connect(
-        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
-        port=5432, sslmode=DB_SSLMODE
-    )
 
 def get_race_links_from_psql(start_year: int, end_year: int):
     """
@@ -33,13 +23,13 @@ def get_race_links_from_psql(start_year: int, end_year: int):
     ORDER BY year, date ASC;
     """
     
-    with conn() as connection:
+    with conn("f1com") as connection:
         with connection.cursor() as cur:
             cur.execute(query, (start_year, end_year))
             links = cur.fetchall()
             return links
 
-def scrape_race_details(race_link: str, year: int, grand_prix: str):
+def scrape_race_details(race_link: str, year: int, grand_prix: str, html: str | None = None):
     """
     Scrapes detailed results from a specific race page.
     
@@ -47,6 +37,7 @@ def scrape_race_details(race_link: str, year: int, grand_prix: str):
         race_link (str): The full URL for the race.
         year (int): The year of the race.
         grand_prix (str): The name of the Grand Prix.
+        html (str): The page body, if it was already fetched.
 
     Returns:
         A pandas DataFrame with the detailed results.
@@ -56,35 +47,18 @@ def scrape_race_details(race_link: str, year: int, grand_prix: str):
     print(f"Grand Prix: {grand_prix}")
 
     try:
-        response = requests.get(race_link, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'lxml')
-        
-        main = soup.find('main')
-        table = main.find('table')
-        th_tag = table.find_all('th')
-
-        headers = ["YEAR", "GRAND PRIX"]        # Creating a list for dataframe headers
-
-        for th in th_tag:
-            p_tag = th.find('p')
-            header_data = p_tag.get_text()
-            headers.append(header_data)
-
-        table_rows = table.find_all('tr')
-        
-        all_rows = []                       # list to store all the rows of the table
-        
-        for row in table_rows:
-            cells = row.find_all('td')
-            n_row = [year, grand_prix]      # list to store each row, which we'll then append into the all_rows list
-            for cell in cells:
-                row_p = cell.find('p')
-                row_data = row_p.get_text()
-                n_row.append(row_data)
-
-            all_rows.append(n_row)
+        if html is None:
+            html = http_client.get(race_link, timeout=10).text
+
+        table = table_parser.p_table(html)     # first <p> of each cell in the <main> table
+        if table is None:
+            print(f"[{grand_prix}, {year}] No results table found.")
+            return pd.DataFrame()
+        th_text, table_rows = table
+
+        headers = ["YEAR", "GRAND PRIX"] + th_text       # Creating a list for dataframe headers
+
+        all_rows = [[year, grand_prix] + row for row in table_rows]   # one list per table row
         table_df = pd.DataFrame(all_rows, columns=headers)
         table_df['DRIVER'] = table_df['DRIVER'].str[:-3]
         # print(table_df["DRIVER"])
@@ -136,62 +110,35 @@ def clean_race_details(df):
 
     return df
 
-def upsert_to_psql(df, table_name: str, conflict_target: tuple, year: int, grand_prix: str, failed_upserts: list):
+def upsert_to_psql(cur, races, table_name: str, conflict_target: tuple):
     """
-    Upserts DataFrame records into a PostgreSQL table.
+    Upserts the cleaned DataFrames of `races` [(race, sha, df)] in one merge and
+    records their page fingerprints, inside a savepoint: on error only this
+    write is rolled back and the exception is re-raised.
     """
-    if df.empty:
-        print("DataFrame is empty, nothing to upsert.")
-        return failed_upserts
-    
-    with conn() as connection:
-        with connection.cursor() as cur:
-            try:
-                # FIX: Drop duplicates within the DataFrame before upserting.
-                # This prevents the CardinalityViolation error.
-                df.drop_duplicates(subset=list(conflict_target), inplace=True)
-                
-                # Convert DataFrame to a list of tuples for bulk insertion
-                df_tuples = [tuple(row) for row in df.itertuples(index=False)]
-
-                # Dynamically create the column list for the SQL query
-                columns = ', '.join(f'"{col}"' for col in df.columns)
-                
-                # Define the update columns for the ON CONFLICT clause
-                update_cols_str = ', '. join(f'"{col}" = EXCLUDED."{col}"' for col in df.columns if col not in conflict_target)
-                
-                # Build the upsert query
-                upsert_query = f"""
-                INSERT INTO {table_name} ({columns})
-                VALUES %s
-                ON CONFLICT {str(conflict_target).replace("'", '"')} DO UPDATE SET
-                {update_cols_str};
-                """ 
-
-                # Execute the upsert using execute_values for efficiency
-                extras.execute_values(
-                    cur,
-                    upsert_query,
-                    df_tuples,
-                    page_size=100
-                )
-                
-                connection.commit()
-                print(f"Successfully upserted {len(df_tuples)} rows into {table_name}.")
-
-            except Exception as e:
-                print(f"An error occurred during upsert: {e}")
-                failed_upserts.append((year, grand_prix))
-                connection.rollback()
-            
-            finally:
-                return failed_upserts
+    frames = [df for _, _, df in races if not df.empty]
+    with savepoint(cur, "races"):
+        if frames:
+            # COPY into a staging table + one merge; duplicate keys in the
+            # batch are collapsed first (prevents the CardinalityViolation error).
+            n = upsert_df(cur, pd.concat(frames, ignore_index=True), table_name, conflict_target)
+            print(f"Successfully upserted {n} changed rows into {table_name}.")
+        record_fingerprints(cur, {link: sha for (_, link, _), sha, _ in races})
 
 if __name__ == "__main__":
 
+    http_client.offline_from_argv()
+    force = "--force" in sys.argv    # re-parse and re-write pages even if unchanged
+    resume = "--resume" in sys.argv  # skip races journaled by an earlier run
+    sys.argv = [a for a in sys.argv if a not in ("--force", "--resume")]
+    every = 1                        # --commit-every race | N | year (races per transaction)
+    if "--commit-every" in sys.argv:
+        i = sys.argv.index("--commit-every")
+        every = commit_every(sys.argv[i + 1])
+        del sys.argv[i:i + 2]
     if len(sys.argv) < 2:
         print("Error: Please provide a year or a range of years to scrape.")
-        print("Usage: python race_details_scraper.py <YEAR> [END_YEAR]")
+        print("Usage: python race_details_scraper.py <YEAR> [END_YEAR] [--offline] [--force] [--resume] [--commit-every race|N|year]")
         sys.exit(1)
 
     try:
@@ -208,14 +155,74 @@ if __name__ == "__main__":
         print(f"No race links found in the 'races' table for years {start_year}-{end_year}. Please run the races scraper first.")
         sys.exit(0)
 
+    # progress journal (checkpoint.py): one unit per race link, committed races only
+    years = range(start_year, end_year + 1)
+    if resume:
+        journaled = {y: checkpoint.done_units("results", y) for y in years}
+        race_links = [r for r in race_links if r[1] not in journaled[r[0]]]
+        print(f"Resuming: {len(race_links)} race(s) left")
+    else:
+        checkpoint.reset("results", years)
+
+    def journal(races):
+        for year, link, _ in races:
+            checkpoint.mark_done("results", year, link)
+
     failed_upserts = []
-    for year, link, grand_prix in race_links:
-        detailed_data_df = scrape_race_details(link, year, grand_prix)
-        if not detailed_data_df.empty:
-            cleaned_df = clean_race_details(detailed_data_df)
-            failed_upserts = upsert_to_psql(cleaned_df, "results", ("year", "grand_prix", "car_number"), 
-                                            year, grand_prix, failed_upserts)
-        # Add a delay between requests to be polite to the server
-        time.sleep(random.randint(2, 5))
+    unchanged = []
+
+    # Overlap page fetches, parsing/cleaning and DB writes (see pipeline.py)
+    def fetch(race):
+        year, link, grand_prix = race
+        return http_client.get(link, timeout=10).text
+
+    def parse(race, html):
+        year, link, grand_prix = race
+        sha = page_fingerprint(html)
+        if known.get(link) == sha:
+            return None
+        return sha, clean_race_details(scrape_race_details(link, year, grand_prix, html))
+
+    with conn("f1com") as connection:
+        with connection.cursor() as cur:
+            # Pages identical to the last written version are skipped before parsing
+            ensure_fingerprint_table(cur)
+            connection.commit()
+            known = {} if force else load_fingerprints(cur, [link for _, link, _ in race_links])
+            committer = Committer(connection, every, on_commit=journal)
+
+            def write(batch):
+                # several races per upsert; if that fails, retry race by race so only bad ones are lost
+                races = []
+                for race, parsed in batch:
+                    if parsed is None:
+                        unchanged.append(race)
+                    else:
+                        races.append((race, *parsed))
+                journal([race for race, parsed in batch if parsed is None])
+                if not races:
+                    return
+                committer.make_room(len(races))
+                written = races
+                try:
+                    upsert_to_psql(cur, races, "results", ("year", "grand_prix", "car_number"))
+                except DBError:
+                    written = []
+                    for one in races:
+                        try:
+                            upsert_to_psql(cur, [one], "results", ("year", "grand_prix", "car_number"))
+                            written.append(one)
+                        except DBError as e:
+                            print(f"An error occurred during upsert: {e}")
+                            year, _, grand_prix = one[0]
+                            failed_upserts.append((year, grand_prix))
+                committer.done(*[race for race, _, _ in written])
+
+            fetch_failures = run_pipeline(race_links, fetch, parse, write, fetch_workers=4, parse_workers=2,
+                                          batch_size=committer.batch_size(5))
+            committer.flush()
+    failed_upserts += [(year, grand_prix) for (year, _, grand_prix), _ in fetch_failures]
+    print(f"{len(race_links) - len(unchanged) - len(failed_upserts)} page(s) changed, {len(unchanged)} unchanged")
+    report_stats()
     for i in failed_upserts:
-        print(i)
+        print(i)
\ No newline at end of file
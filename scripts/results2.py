@@ -1,26 +1,11 @@
 import requests
-import time
+import http_client
+import table_parser
 import sys
 import pandas as pd
-from bs4 import BeautifulSoup
-import psycopg2
-from psycopg2 import extras
-import random
+from storage import conn, upsert_df
 import numpy as np
 
-# My DB and Session configurations
-DB_HOST = "database-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com"
-DB_NAME = "postgres"
-DB_USER = "postgres"
-DB_PASSWORD = "OnePieceReal.7143"
-DB_SSLMODE = "require"
-
-def conn():
-    """Establishes a connection to the PostgreSQL database."""
-    return psycopg2.connect(
-        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
-        port=5432, sslmode=DB_SSLMODE
-    )
 
 def get_race_links_from_psql(start_year: int, end_year: int):
     """
@@ -33,7 +18,7 @@ def get_race_links_from_psql(start_year: int, end_year: int):
     ORDER BY year, date ASC;
     """
     
-    with conn() as connection:
+    with conn("f1com") as connection:
         with connection.cursor() as cur:
             cur.execute(query, (start_year, end_year))
             links = cur.fetchall()
@@ -56,35 +41,17 @@ def scrape_race_details(race_link: str, year: int, grand_prix: str):
     print(f"Grand Prix: {grand_prix}")
 
     try:
-        response = requests.get(race_link, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'lxml')
-        
-        main = soup.find('main')
-        table = main.find('table')
-        th_tag = table.find_all('th')
-
-        headers = ["YEAR", "GRAND PRIX"]        # Creating a list for dataframe headers
-
-        for th in th_tag:
-            p_tag = th.find('p')
-            header_data = p_tag.get_text()
-            headers.append(header_data)
-
-        table_rows = table.find_all('tr')
-        
-        all_rows = []                       # list to store all the rows of the table
-        
-        for row in table_rows:
-            cells = row.find_all('td')
-            n_row = [year, grand_prix]      # list to store each row, which we'll then append into the all_rows list
-            for cell in cells:
-                row_p = cell.find('p')
-                row_data = row_p.get_text()
-                n_row.append(row_data)
-
-            all_rows.append(n_row)
+        response = http_client.get(race_link, timeout=10)
+
+        table = table_parser.p_table(response.text)     # first <p> of each cell in the <main> table
+        if table is None:
+            print(f"[{grand_prix}, {year}] No results table found.")
+            return pd.DataFrame()
+        th_text, table_rows = table
+
+        headers = ["YEAR", "GRAND PRIX"] + th_text       # Creating a list for dataframe headers
+
+        all_rows = [[year, grand_prix] + row for row in table_rows]   # one list per table row
         table_df = pd.DataFrame(all_rows, columns=headers)
         table_df['DRIVER'] = table_df['DRIVER'].str[:-3]
         # print(table_df["DRIVER"])
@@ -144,40 +111,15 @@ def upsert_to_psql(df, table_name: str, conflict_target: tuple, year: int, grand
         print("DataFrame is empty, nothing to upsert.")
         return failed_upserts
     
-    with conn() as connection:
+    with conn("f1com") as connection:
         with connection.cursor() as cur:
             try:
-                # FIX: Drop duplicates within the DataFrame before upserting.
-                # This prevents the CardinalityViolation error.
-                df.drop_duplicates(subset=list(conflict_target), inplace=True)
-                
-                # Convert DataFrame to a list of tuples for bulk insertion
-                df_tuples = [tuple(row) for row in df.itertuples(index=False)]
+                # COPY into a staging table + one merge; duplicate keys in the
+                # batch are collapsed first (prevents the CardinalityViolation error).
+                n = upsert_df(cur, df, table_name, conflict_target)
 
-                # Dynamically create the column list for the SQL query
-                columns = ', '.join(f'"{col}"' for col in df.columns)
-                
-                # Define the update columns for the ON CONFLICT clause
-                update_cols_str = ', '. join(f'"{col}" = EXCLUDED."{col}"' for col in df.columns if col not in conflict_target)
-                
-                # Build the upsert query
-                upsert_query = f"""
-                INSERT INTO {table_name} ({columns})
-                VALUES %s
-                ON CONFLICT {str(conflict_target).replace("'", '"')} DO UPDATE SET
-                {update_cols_str};
-                """ 
-
-                # Execute the upsert using execute_values for efficiency
-                extras.execute_values(
-                    cur,
-                    upsert_query,
-                    df_tuples,
-                    page_size=100
-                )
-                
                 connection.commit()
-                print(f"Successfully upserted {len(df_tuples)} rows into {table_name}.")
+                print(f"Successfully upserted {n} rows into {table_name}.")
 
             except Exception as e:
                 print(f"An error occurred during upsert: {e}")
@@ -273,9 +215,10 @@ def upsert_to_psql(df, table_name: str, conflict_target: tuple, year: int, grand
 
 if __name__ == "__main__":
 
+    http_client.offline_from_argv()
     if len(sys.argv) < 2:
         print("Error: Please provide a year or a range of years to scrape.")
-        print("Usage: python race_details_scraper.py <YEAR> [END_YEAR]")
+        print("Usage: python race_details_scraper.py <YEAR> [END_YEAR] [--offline]")
         sys.exit(1)
 
     try:
@@ -299,7 +242,5 @@ if __name__ == "__main__":
             cleaned_df = clean_race_details(detailed_data_df)
             failed_upserts = upsert_to_psql(cleaned_df, "results", ("year", "grand_prix", "car_number"), 
                                             year, grand_prix, failed_upserts)
-        # Add a delay between requests to be polite to the server
-        time.sleep(random.randint(2, 5))
     for i in failed_upserts:
         print(i)
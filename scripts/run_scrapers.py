@@ -24,6 +24,7 @@ if __name__ == "__main__":
     parser.add_argument("--races", action="store_true", help="Run the races scraper.")
     parser.add_argument("--results", action="store_true", help="Run the results scraper.")
     parser.add_argument("--year", type=int, nargs='+', help="Years to scrape (e.g., --year 2010 2012).")
+    parser.add_argument("--offline", action="store_true", help="Re-parse archived pages without any network requests.")
 
     args = parser.parse_args()
 
@@ -31,17 +32,18 @@ if __name__ == "__main__":
     years = []
     if args.year:
         years = [str(y) for y in args.year]
+    extra = ["--offline"] if args.offline else []
     
     # Run the selected scraper(s).
     if args.races:
         if not years:
             print("Please provide at least one year with --year when running --races.")
         else:
-            run_scraper("races.py", args=years)
+            run_scraper("races.py", args=years + extra)
             
     if args.results:
         # The results scraper does not need year arguments as it queries the DB.
-        run_scraper("results.py")
+        run_scraper("results.py", args=extra)
     
     if not (args.races or args.results):
         print("No scraper selected. Use --races, --results, or both.")
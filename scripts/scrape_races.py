@@ -1,42 +1,18 @@
 #!/usr/bin/env python
 
-import time
 import re
-import requests
-import requests_cache
-from bs4 import BeautifulSoup
+import http_client
+import table_parser
 from urllib.parse import urljoin
-import psycopg2
-from psycopg2.extras import execute_values
+from storage import conn, execute_values
 import unicodedata
+from fetch_engine import fetch_all, DEFAULT_CONCURRENCY, DEFAULT_RATE
 
-# Assumed DB and Session configurations
-DB_HOST = "database-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com"
-DB_NAME = "postgres"
-DB_USER = "postgres"
-DB_PASSWORD = "OnePieceReal.7143"
-DB_SSLMODE = "require"
 BASE = "https://www.formula1.com"
 
-requests_cache.install_cache("f1_cache", expire_after=24*3600)
-SESSION = requests.Session()
-SESSION.headers.update({
-    "User-Agent": "F1ApexAnalyst/1.0 (academic/personal project; contact: you@example.com)"
-})
-REQUEST_DELAY = 1.0
-
 def get(url):
-    resp = SESSION.get(url, timeout=30)
-    if not getattr(resp, "from_cache", False):
-        time.sleep(REQUEST_DELAY)
-    resp.raise_for_status()
-    return resp
-
-def conn():
-    return psycopg2.connect(
-        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
-        port=5432, sslmode=DB_SSLMODE
-    )
+    """GET with cache; non-cached requests are paced per host by rate_control."""
+    return http_client.get(url)
 
 def normalize_space(s):
     return re.sub(r"\s+", " ", s or "").strip()
@@ -73,19 +49,19 @@ def upsert_legacy_races(cur, rows):
     """
     execute_values(cur, sql, rows)
 
-def get_circuit_and_country(url):
+def get_circuit_and_country(url, html=None):
     try:
-        resp = get(url)
-        soup = BeautifulSoup(resp.text, "lxml")
+        if html is None:
+            html = get(url).text
+        root = table_parser.parse(html)     # the circuit line sits outside <main>
     except Exception as e:
         print(f"Error fetching {url}: {e}")
         return None, None
     
-    circuit_tag = soup.select_one("p.typography-module_body-xs-semibold__Fyfwn")
+    circuit_text = table_parser.circuit_text(root)
     circuit = None
     country = None
-    if circuit_tag:
-        circuit_text = circuit_tag.get_text(" ", strip=True)
+    if circuit_text:
         if "," in circuit_text:
             parts = circuit_text.split(",")
             circuit = normalize_unicode(parts[0].strip())
@@ -94,55 +70,58 @@ def get_circuit_and_country(url):
     
     return circuit, country
 
-def parse_year_index(year: int):
-    candidates = [
+def year_index_urls(year: int):
+    return [
         f"{BASE}/en/results/{year}/races",
         f"{BASE}/en/results.html/{year}/races.html",
     ]
-    html = None
-    for u in candidates:
-        try:
-            html = get(u).text
-            break
-        except Exception:
-            continue
+
+def fetch_year_indexes(years, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE):
+    """Fetch the season index pages for `years` in parallel -> {year: html}."""
+    urls = {y: year_index_urls(y)[0] for y in years}
+    pages = fetch_all(urls.values(), get, concurrency=concurrency, rate=rate,
+                      is_cached=http_client.is_cached)
+    return {y: pages[u].text for y, u in urls.items() if not isinstance(pages[u], Exception)}
+
+def parse_year_index(year: int, html: str | None = None):
+    # html may come prefetched from fetch_year_indexes; otherwise walk the candidates
+    if html is None:
+        for u in year_index_urls(year):
+            try:
+                html = get(u).text
+                break
+            except Exception:
+                continue
     if html is None:
         raise RuntimeError(f"Could not fetch year index for {year}")
 
-    soup = BeautifulSoup(html, "lxml")
-    table = None
-    for t in soup.select("table"):
-        heads = [h.get_text(" ", strip=True).lower() for h in t.select("thead th")]
-        if any("grand prix" in h for h in heads) and any("date" in h for h in heads):
-            table = t
-            break
+    table = table_parser.find_table(html, lambda heads: any("grand prix" in h for h in heads)
+                                                        and any("date" in h for h in heads))
     if table is None:
         raise RuntimeError("No results table with Grand Prix + Date headers found")
 
-    headers = [h.get_text(" ", strip=True) for h in table.select("thead th")]
-    lower = [h.lower() for h in headers]
+    lower = table_parser.headers(table)
     gp_idx = next(i for i, h in enumerate(lower) if "grand prix" in h)
     date_idx = next(i for i, h in enumerate(lower) if "date" in h)
 
     rows = []
     rnd = 0
-    for tr in table.select("tbody tr"):
-        tds = tr.find_all("td")
+    for tr in table_parser.body_rows(table):
+        tds = table_parser.cells(tr)
         if len(tds) <= max(gp_idx, date_idx):
             continue
 
         gp_cell = tds[gp_idx]
         
         # Get the grand prix name from the yearly index for the database
-        gp_text_raw = gp_cell.get_text(" ", strip=True)
+        gp_text_raw = table_parser.spaced_text(gp_cell)
         gp_text = normalize_unicode(gp_text_raw)
         
-        date_text = tds[date_idx].get_text(" ", strip=True)
+        date_text = table_parser.spaced_text(tds[date_idx])
 
-        ahref = tr.select_one('a[href*="race-result"]') or tr.select_one("a[href]")
-        if not ahref:
+        href = table_parser.first_link(tr, contains="race-result")
+        if not href:
             continue
-        href = ahref.get("href")
         if not href.endswith("/race-result"):
             href = href.rstrip("/") + "/race-result"
         result_url = urljoin(BASE, href)
@@ -157,20 +136,32 @@ def parse_year_index(year: int):
         })
     return rows
 
-def scrape_all_races(start_year: int, end_year: int):
-    with conn() as connection:
+def scrape_all_races(start_year: int, end_year: int, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE):
+    years = list(range(start_year, end_year + 1))
+    indexes = fetch_year_indexes(years, concurrency=concurrency, rate=rate)
+    with conn("f1com") as connection:
         with connection.cursor() as cur:
-            for y in range(start_year, end_year + 1):
+            for y in years:
                 try:
-                    race_data = parse_year_index(y)
+                    race_data = parse_year_index(y, indexes.get(y))
                     if not race_data:
                         print(f"[{y}] No races found in index.")
                         continue
-                    
+
+                    # Pull every results page of the season in parallel
+                    pages = fetch_all([r["result_url"] for r in race_data], get,
+                                      concurrency=concurrency, rate=rate,
+                                      is_cached=http_client.is_cached)
+
                     # New loop to get circuit and country from results page
                     final_data = []
                     for r in race_data:
-                        circuit, country = get_circuit_and_country(r["result_url"])
+                        resp = pages[r["result_url"]]
+                        if isinstance(resp, Exception):
+                            print(f"Error fetching {r['result_url']}: {resp}")
+                            circuit, country = None, None
+                        else:
+                            circuit, country = get_circuit_and_country(r["result_url"], resp.text)
                         r['country'] = country
                         # Temporarily use grand_prix column for circuit name
                         # We'll fix the schema later as you requested
@@ -190,11 +181,12 @@ def scrape_all_races(start_year: int, end_year: int):
 
 if __name__ == "__main__":
     import sys
+    http_client.offline_from_argv()
     if len(sys.argv) == 3:
         s, e = int(sys.argv[1]), int(sys.argv[2])
     elif len(sys.argv) == 2:
         s = e = int(sys.argv[1])
     else:
-        print("Usage: python scrape_races.py <YEAR> [<END_YEAR>]")
+        print("Usage: python scrape_races.py <YEAR> [<END_YEAR>] [--offline]")
         sys.exit(1)
     scrape_all_races(s, e)
\ No newline at end of file
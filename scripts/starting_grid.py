@@ -1,26 +1,12 @@
 import requests
-import time
+import http_client
+import table_parser
+import checkpoint
 import sys
 import pandas as pd
-from bs4 import BeautifulSoup
-import psycopg2
-from psycopg2 import extras
-import random
+from storage import conn, upsert_df
 import numpy as np
 
-# My DB and Session configurations
-DB_HOST = "database-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com"
-DB_NAME = "postgres"
-DB_USER = "postgres"
-DB_PASSWORD = "OnePieceReal.7143"
-DB_SSLMODE = "require"
-
-def conn():
-    """Establishes a connection to the PostgreSQL database."""
-    return psycopg2.connect(
-        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
-        port=5432, sslmode=DB_SSLMODE
-    )
 
 def get_race_links_from_psql(start_year: int, end_year: int):
     """
@@ -33,7 +19,7 @@ def get_race_links_from_psql(start_year: int, end_year: int):
     ORDER BY year, date ASC;
     """
     
-    with conn() as connection:
+    with conn("f1com") as connection:
         with connection.cursor() as cur:
             cur.execute(query, (start_year, end_year))
             links = cur.fetchall()
@@ -56,37 +42,19 @@ def scrape_starting_grid(race_link: str, year: int, grand_prix: str):
     print(f"Grand Prix: {grand_prix}")
 
     try:
-        response = requests.get(race_link, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'lxml')
-        
-        main = soup.find('main')
-        table = main.find('table')
-        th_tag = table.find_all('th')
+        response = http_client.get(race_link, timeout=10)
 
-        headers = ["YEAR", "GRAND PRIX"]        # Creating a list for dataframe headers
+        table = table_parser.p_table(response.text)     # first <p> of each cell in the <main> table
+        if table is None:
+            print(f"[{grand_prix}, {year}] No results table found.")
+            return pd.DataFrame()
+        th_text, table_rows = table
 
-        for th in th_tag:
-            p_tag = th.find('p')
-            header_data = p_tag.get_text()
-            headers.append(header_data)
+        headers = ["YEAR", "GRAND PRIX"] + th_text       # Creating a list for dataframe headers
 
         # the headers extracted from the table should be pos, car-number, driver, team and time
 
-        table_rows = table.find_all('tr')
-        
-        all_rows = []                       # list to store all the rows of the table
-        
-        for row in table_rows:
-            cells = row.find_all('td')
-            n_row = [year, grand_prix]      # list to store each row, which we'll then append into the all_rows list
-            for cell in cells:
-                row_p = cell.find('p')
-                row_data = row_p.get_text()
-                n_row.append(row_data)
-
-            all_rows.append(n_row)
+        all_rows = [[year, grand_prix] + row for row in table_rows]   # one list per table row
         table_df = pd.DataFrame(all_rows, columns=headers)
         table_df['DRIVER'] = table_df['DRIVER'].str[:-3]
         # print(table_df["DRIVER"])
@@ -137,52 +105,36 @@ def clean_dataframe(df):
 def upsert_to_psql(df, table_name: str, conflict_target: tuple):
     """
     Upserts DataFrame records into a PostgreSQL table.
+    Returns True once the rows are committed.
     """
     if df.empty:
         print("DataFrame is empty, nothing to upsert.")
-        return
+        return False
         
-    with conn() as connection:
+    with conn("f1com") as connection:
         with connection.cursor() as cur:
             try:
-                # Convert DataFrame to a list of tuples for bulk insertion
-                df_tuples = [tuple(row) for row in df.itertuples(index=False)]
-
-                # Dynamically create the column list for the SQL query
-                columns = ', '.join(f'"{col}"' for col in df.columns)
-                
-                # Define the update columns for the ON CONFLICT clause
-                update_cols_str = ', '. join(f'"{col}" = EXCLUDED."{col}"' for col in df.columns if col not in conflict_target)
-                
-                # Build the upsert query
-                upsert_query = f"""
-                INSERT INTO {table_name} ({columns})
-                VALUES %s
-                ON CONFLICT {str(conflict_target).replace("'", '"')} DO UPDATE SET
-                {update_cols_str};
-                """ 
-
-                # Execute the upsert using execute_values for efficiency
-                extras.execute_values(
-                    cur,
-                    upsert_query,
-                    df_tuples,
-                    page_size=100
-                )
-                
+                # COPY into a staging table + one merge
+                n = upsert_df(cur, df, table_name, conflict_target)
+
                 connection.commit()
-                print(f"Successfully upserted {len(df_tuples)} rows into {table_name}.")
+                print(f"Successfully upserted {n} rows into {table_name}.")
+                return True
 
             except Exception as e:
                 print(f"An error occurred during upsert: {e}")
                 connection.rollback()
+                return False
 
 
 if __name__ == "__main__":
 
+    http_client.offline_from_argv()
+    resume = "--resume" in sys.argv  # skip races journaled by an earlier run
+    sys.argv = [a for a in sys.argv if a != "--resume"]
     if len(sys.argv) < 2:
         print("Error: Please provide a year or a range of years to scrape.")
-        print("Usage: python race_details_scraper.py <YEAR> [END_YEAR]")
+        print("Usage: python race_details_scraper.py <YEAR> [END_YEAR] [--offline] [--resume]")
         sys.exit(1)
 
     try:
@@ -199,12 +151,19 @@ if __name__ == "__main__":
         print(f"No race links found in the 'races' table for years {start_year}-{end_year}. Please run the races scraper first.")
         sys.exit(0)
 
-    for year, link, grand_prix in race_links:
-        link = link.replace("race-result", "starting-grid")
+    # progress journal (checkpoint.py): one unit per race link, committed races only
+    years = range(start_year, end_year + 1)
+    if resume:
+        journaled = {y: checkpoint.done_units("starting_grid", y) for y in years}
+        race_links = [r for r in race_links if r[1] not in journaled[r[0]]]
+        print(f"Resuming: {len(race_links)} race(s) left")
+    else:
+        checkpoint.reset("starting_grid", years)
+
+    for year, race_link, grand_prix in race_links:
+        link = race_link.replace("race-result", "starting-grid")
         detailed_data_df = scrape_starting_grid(link, year, grand_prix)
         if not detailed_data_df.empty:
             cleaned_df = clean_dataframe(detailed_data_df)
-            upsert_to_psql(cleaned_df, "starting_grid", ("year", "grand_prix", "pos"))
-        
-        # Add a delay between requests to be polite to the server
-        time.sleep(random.randint(2, 5))
+            if upsert_to_psql(cleaned_df, "starting_grid", ("year", "grand_prix", "pos")):
+                checkpoint.mark_done("starting_grid", year, race_link)
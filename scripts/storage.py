@@ -0,0 +1,241 @@
+# storage.py
+# One storage interface for every scraper/loader: the shared Postgres (db.py)
+# or a tuned local SQLite file, chosen with F1_STORAGE=postgres|sqlite.
+#
+#   with storage.conn("openf1") as connection:
+#       with connection.cursor() as cur:
+#           storage.upsert(cur, "lap_times", columns, rows, conflict=(...))
+#
+# Sources ("openf1", "f1com", "ergast") reuse table names with different
+# shapes (three different `results` tables), so on SQLite each source gets its
+# own database file and its own bundled schema, sql/sqlite/<source>.sql. The
+# SQLite side runs in WAL mode with relaxed fsync and writes in executemany
+# batches, so whole pipelines can be run and timed on one machine.
+#
+# Scripts keep writing Postgres-flavoured SQL: the SQLite cursor rewrites
+# %s placeholders and now(); DDL issued at runtime goes through ddl(), which
+# is a no-op on SQLite because the bundled schema already has every table.
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import psycopg2
+import psycopg2.extras
+
+import db
+import pg_bulk
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SQLITE_SCHEMA_DIR = os.path.join(ROOT, "sql", "sqlite")
+SQLITE_DIR = os.environ.get("F1_SQLITE_DIR", os.path.join(ROOT, "data"))
+SQLITE_FILES = {"ergast": "f1.sqlite"}          # default: <source>.sqlite
+
+# fetch_data.py always wrote a local SQLite file; everything else used RDS
+DEFAULT_BACKEND = {"ergast": "sqlite"}
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",        # WAL + NORMAL: durable on commit, no fsync per statement
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",         # 64 MiB page cache
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA foreign_keys=ON",
+)
+
+# raised by either backend; use in `except storage.Error`
+Error = (psycopg2.Error, sqlite3.Error)
+
+sqlite3.register_adapter(datetime, lambda v: v.isoformat())
+sqlite3.register_adapter(date, lambda v: v.isoformat())
+
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def backend(source):
+    return os.environ.get("F1_STORAGE") or DEFAULT_BACKEND.get(source, "postgres")
+
+
+def sqlite_path(source):
+    return os.path.join(SQLITE_DIR, SQLITE_FILES.get(source, f"{source}.sqlite"))
+
+
+def dialect(cur):
+    """'sqlite' or 'postgres' for a cursor/connection from conn()."""
+    return getattr(cur, "dialect", "postgres")
+
+
+# --- SQLite adapter with the small slice of the psycopg2 API the scripts use ---
+def _translate(sql):
+    return sql.replace("%s", "?").replace("now()", "CURRENT_TIMESTAMP")
+
+
+def _py(v):
+    if v is None or (isinstance(v, float) and v != v):    # None / NaN -> NULL
+        return None
+    return v.item() if hasattr(v, "item") else v            # numpy scalars
+
+
+class SQLiteCursor:
+    dialect = "sqlite"
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cur = connection.db.cursor()
+
+    def execute(self, sql, params=()):
+        self.connection.begin()
+        self._cur.execute(_translate(sql), [_py(v) for v in params])
+
+    def executemany(self, sql, rows):
+        self.connection.begin()
+        self._cur.executemany(_translate(sql), ([_py(v) for v in r] for r in rows))
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, size):
+        return self._cur.fetchmany(size)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteConnection:
+    dialect = "sqlite"
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # autocommit at the driver level; transactions are opened explicitly so
+        # SAVEPOINTs (db.savepoint) nest inside them like on Postgres
+        self.db = sqlite3.connect(path, isolation_level=None, timeout=30, check_same_thread=False)
+        for pragma in SQLITE_PRAGMAS:
+            self.db.execute(pragma)
+
+    @property
+    def closed(self):
+        return self.db is None
+
+    def begin(self):
+        if not self.db.in_transaction:
+            self.db.execute("BEGIN")
+
+    def cursor(self, name=None):
+        # `name` asks psycopg2 for a server-side cursor; SQLite cursors already step lazily
+        return SQLiteCursor(self)
+
+    def commit(self):
+        if self.db.in_transaction:
+            self.db.execute("COMMIT")
+
+    def rollback(self):
+        if self.db.in_transaction:
+            self.db.execute("ROLLBACK")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+def _ensure_sqlite_schema(connection, source):
+    path = sqlite_path(source)
+    with _schema_lock:
+        if path in _schema_ready:
+            return
+        with open(os.path.join(SQLITE_SCHEMA_DIR, f"{source}.sql")) as f:
+            connection.db.executescript(f.read())
+        _schema_ready.add(path)
+
+
+@contextmanager
+def conn(source):
+    """Connection for `source`; commit on success, roll back on error (like db.conn)."""
+    if backend(source) != "sqlite":
+        with db.conn() as connection:
+            yield connection
+        return
+    connection = SQLiteConnection(sqlite_path(source))
+    try:
+        _ensure_sqlite_schema(connection, source)
+        yield connection
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+# --- writes ---
+def ddl(cur, sql):
+    """Run schema DDL on Postgres; SQLite databases get it from sql/sqlite/<source>.sql."""
+    if dialect(cur) != "sqlite":
+        cur.execute(sql)
+
+
+def execute_values(cur, sql, rows, page_size=100):
+    """psycopg2.extras.execute_values on Postgres; one executemany on SQLite."""
+    rows = list(rows)
+    if dialect(cur) != "sqlite":
+        return psycopg2.extras.execute_values(cur, sql, rows, page_size=max(1, page_size))
+    if rows:
+        values = "(" + ", ".join("?" for _ in rows[0]) + ")"
+        cur.executemany(sql.replace("VALUES %s", f"VALUES {values}"), rows)
+
+
+def upsert(cur, table, columns, rows, conflict, update=None):
+    """
+    Upsert `rows` (tuples in `columns` order): COPY + merge on Postgres (see
+    pg_bulk.copy_upsert), a batched INSERT ... ON CONFLICT on SQLite. Rows equal
+    to the stored ones are skipped on both. Returns the number of rows changed.
+    """
+    if dialect(cur) != "sqlite":
+        return pg_bulk.copy_upsert(cur, table, columns, rows, conflict, update)
+
+    columns = list(columns)
+    rows = pg_bulk.dedupe(rows, [columns.index(c) for c in conflict])
+    if not rows:
+        return 0
+    if update is None:
+        update = [c for c in columns if c not in conflict]
+    q = pg_bulk._quote
+    cols = ", ".join(q(c) for c in columns)
+    if update:
+        action = ("DO UPDATE SET " + ", ".join(f"{q(c)} = excluded.{q(c)}" for c in update)
+                  + f" WHERE ({', '.join(f'{table}.{q(c)}' for c in update)})"
+                  + f" IS NOT ({', '.join(f'excluded.{q(c)}' for c in update)})")
+    else:
+        action = "DO NOTHING"
+    before = cur.connection.db.total_changes
+    cur.executemany(f"""
+        INSERT INTO {table} ({cols}) VALUES ({", ".join("?" for _ in columns)})
+        ON CONFLICT ({", ".join(q(c) for c in conflict)}) {action}
+    """, rows)
+    changed = cur.connection.db.total_changes - before
+    pg_bulk.tally(table, changed, len(rows))
+    return changed
+
+
+def upsert_df(cur, df, table, conflict, update=None):
+    """upsert for a DataFrame whose column names match the table."""
+    return upsert(cur, table, list(df.columns), df.itertuples(index=False, name=None), conflict, update)
+
@@ -0,0 +1,134 @@
+# table_parser.py
+# Targeted extraction of formula1.com results tables with lxml + compiled XPath.
+#
+# The scrapers used to build a BeautifulSoup tree of the whole page (~1 MB of
+# nav, scripts and JSON payloads) and then walk find_all('tr') / find('p') in
+# Python for every cell. Only the <main> block holds data, so here that slice
+# is cut out with a regex first (the same slice change_detect fingerprints),
+# parsed by libxml2 in C, and cells are pulled with XPath expressions compiled
+# once at import. See bench_parsers.py for the comparison with the old path.
+#
+#   headers, rows = table_parser.p_table(html)        # first <p> of every cell
+#   table = table_parser.find_table(html, lambda heads: "date" in heads)
+#   headers, rows = table_parser.text_table(table)    # full cell text
+import re
+
+from lxml import etree
+
+_MAIN = re.compile(r"<main\b.*?</main>", re.S | re.I)
+_PARSER = etree.HTMLParser(remove_comments=True, remove_pis=True)
+
+_TABLES = etree.XPath("//table")
+_HEAD_CELLS = etree.XPath("./thead//th")
+_ALL_HEAD_CELLS = etree.XPath(".//th")
+_BODY_ROWS = etree.XPath("./tbody/tr | ./tr")
+_ALL_ROWS = etree.XPath(".//tr[td]")
+_CELLS = etree.XPath("./td")
+_FIRST_P = etree.XPath("string((.//p)[1])", smart_strings=False)
+_TEXT = etree.XPath("string()", smart_strings=False)
+_TEXT_NODES = etree.XPath(".//text()", smart_strings=False)
+_LINKS = etree.XPath(".//a/@href", smart_strings=False)
+_LINKS_CONTAINING = etree.XPath(".//a[contains(@href, $part)]/@href", smart_strings=False)
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_space(s):
+    return _SPACE.sub(" ", s or "").strip()
+
+
+def parse(html):
+    """Whole document as an lxml tree (for pages that need more than <main>)."""
+    return etree.fromstring(html, _PARSER) if html else None
+
+
+def parse_main(html):
+    """Tree of just the page's <main> block (the whole page if it has none)."""
+    m = _MAIN.search(html or "")
+    return parse(m.group(0) if m else html)
+
+
+def tables(root):
+    return [] if root is None else _TABLES(root)
+
+
+def text(element):
+    """All text under element (like BeautifulSoup's get_text())."""
+    return _TEXT(element)
+
+
+def spaced_text(element):
+    """Text pieces under element stripped and joined by spaces (get_text(" ", strip=True))."""
+    return " ".join(t.strip() for t in _TEXT_NODES(element) if t.strip())
+
+
+def body_rows(table):
+    return _BODY_ROWS(table)
+
+
+def cells(tr):
+    return _CELLS(tr)
+
+
+def head_cells(table):
+    """Every <th> of a table, thead or not."""
+    return _ALL_HEAD_CELLS(table)
+
+
+def headers(table):
+    """Lower-cased thead header texts of a table."""
+    return [spaced_text(th).lower() for th in _HEAD_CELLS(table)]
+
+
+def find_table(html_or_root, match):
+    """First table in <main> whose lower-cased thead headers satisfy match(headers)."""
+    root = parse_main(html_or_root) if isinstance(html_or_root, str) else html_or_root
+    for table in tables(root):
+        if match(headers(table)):
+            return table
+    return None
+
+
+def text_table(table):
+    """(thead headers, [[cell text, ...] per tbody row]) with whitespace collapsed."""
+    heads = [normalize_space(_TEXT(th)) for th in _HEAD_CELLS(table)]
+    rows = [[normalize_space(_TEXT(td)) for td in _CELLS(tr)] for tr in _BODY_ROWS(table)]
+    return heads, rows
+
+
+def p_table(html):
+    """
+    (headers, rows) of the first table in <main> where every header and cell
+    is the text of its first <p> -- the markup of the current results pages.
+    Header-only rows are skipped. Returns None if there is no table.
+    """
+    found = tables(parse_main(html))
+    if not found:
+        return None
+    table = found[0]
+    heads = [_FIRST_P(th) for th in _ALL_HEAD_CELLS(table)]
+    rows = [[_FIRST_P(td) for td in _CELLS(tr)] for tr in _ALL_ROWS(table)]
+    return heads, rows
+
+
+def has_class(name):
+    """XPath predicate for a class token (CSS .name)."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+CIRCUIT = etree.XPath(f"(//p[{has_class('typography-module_body-xs-semibold__Fyfwn')}])[1]")
+
+
+def circuit_text(root):
+    """'Circuit, Country' line of a race page (p.typography-module_body-xs-semibold__Fyfwn), or None."""
+    found = CIRCUIT(root)
+    return spaced_text(found[0]) if found else None
+
+
+def first_link(element, contains=None):
+    """href of the first <a href> under element (preferring hrefs containing `contains`)."""
+    if contains:
+        hrefs = _LINKS_CONTAINING(element, part=contains)
+        if hrefs:
+            return hrefs[0]
+    hrefs = _LINKS(element)
+    return hrefs[0] if hrefs else None
@@ -1,31 +1,15 @@
 # Getting team results for each year
 
 import requests
-import time
-from bs4 import BeautifulSoup
+import http_client
+import table_parser
 import pandas as pd
 import re
-import requests_cache
-import psycopg2
-from psycopg2.extras import execute_values
+from storage import conn, upsert_df
 import unicodedata
 from datetime import datetime
-from psycopg2 import extras
-import random
-
-# My DB and Session configurations
-DB_HOST = "database-1.cxm64uci8hxe.us-east-2.rds.amazonaws.com"
-DB_NAME = "postgres"
-DB_USER = "postgres"
-DB_PASSWORD = "OnePieceReal.7143"
-DB_SSLMODE = "require"
-BASE = "https://www.formula1.com"
 
-def conn():
-    return psycopg2.connect(
-        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
-        port=5432, sslmode=DB_SSLMODE
-    )
+BASE = "https://www.formula1.com"
 
 def scrape_team_results(link, year):
     """
@@ -43,44 +27,23 @@ def scrape_team_results(link, year):
     print(f"{year} Team Standings")
 
     try:
-            response = requests.get(link, timeout=10)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.text, 'lxml')
-            
-            main = soup.find('main')
-            table = main.find('table')
-            th_tag = table.find_all('th')
-
-            headers = ["YEAR"]        # Creating a list for dataframe headers
-
-            for th in th_tag:
-                p_tag = th.find('p')
-                header_data = p_tag.get_text()
-                headers.append(header_data)
-
-            table_rows = table.find_all('tr')
-            
-            all_rows = []                       # list to store all the rows of the table
-            
-            for row in table_rows:
-                cells = row.find_all('td')
-                n_row = [year]      # list to store each row, which we'll then append into the all_rows list
-                for cell in cells:
-                    row_p = cell.find('p')
-                    row_data = row_p.get_text()
-                    n_row.append(row_data)
-
-                all_rows.append(n_row)
-            table_df = pd.DataFrame(all_rows, columns=headers)
+            response = http_client.get(link, timeout=10)
 
-            time.sleep(random.randint(3,10))
+            table = table_parser.p_table(response.text)     # first <p> of each cell in the <main> table
+            if table is None:
+                print(f"[{year}] No table found.")
+                return pd.DataFrame()
+            th_text, table_rows = table
+
+            headers = ["YEAR"] + th_text        # Creating a list for dataframe headers
+
+            all_rows = [[year] + row for row in table_rows]     # one list per table row
+            table_df = pd.DataFrame(all_rows, columns=headers)
 
             return table_df
 
     except requests.exceptions.RequestException as e:
             print(f"[{year}] Error accessing URL: {e}")
-            time.sleep(random.randint(3,10))
             return pd.DataFrame()
 
         
@@ -89,39 +52,18 @@ def upsert_to_psql(df, table_name):
     """
     Upserts DataFrame records into a PostgreSQL table.
     """
-    with conn() as connection:
+    with conn("f1com") as connection:
         with connection.cursor() as cur:
 
-            # Convert DataFrame to a list of tuples for bulk insertion
-            df_tuples = [tuple(row) for row in df.itertuples(index=False)]
-
-            # Dynamically create the column list for the SQL query
-            columns = ', '.join(f'"{col}"' for col in df.columns)
-            
             # Define the primary key for the ON CONFLICT clause
             # Assuming a composite key of (year, team)
-            conflict_target = '(year, team)'
-            
-            # Define the update columns for the ON CONFLICT clause
-            update_columns = ', '.join(f'"{col}" = EXCLUDED."{col}"' for col in df.columns if col not in ['year', 'team'])
-
-            upsert_query = f"""
-            INSERT INTO {table_name} ({columns})
-            VALUES %s
-            ON CONFLICT {conflict_target} DO UPDATE SET
-            {update_columns};
-            """
-            
-            # Execute the upsert using execute_values for efficiency
-            extras.execute_values(
-                cur,
-                upsert_query,
-                df_tuples,
-                page_size=100
-            )
-            
+            conflict_target = ('year', 'team')
+
+            # COPY into a staging table + one merge (updates every non-key column)
+            n = upsert_df(cur, df, table_name, conflict_target)
+
             connection.commit()
-            print(f"Successfully upserted {len(df_tuples)} rows into {table_name}.")
+            print(f"Successfully upserted {n} rows into {table_name}.")
 
 def clean_team_data(df):
     
@@ -142,12 +84,13 @@ def clean_team_data(df):
 
 if __name__ == "__main__":
     import sys
+    http_client.offline_from_argv()
     if len(sys.argv) == 3:
         s, e = int(sys.argv[1]), int(sys.argv[2])
     elif len(sys.argv) == 2:
         s = e = int(sys.argv[1])
     else:
-        print("Usage: python scrape_races.py <YEAR> [<END_YEAR>]")
+        print("Usage: python scrape_races.py <YEAR> [<END_YEAR>] [--offline]")
         sys.exit(1)
     
     for year in range(s, e+1):
@@ -0,0 +1,62 @@
+-- Ergast tables (fetch_data.py), the schema it used to expect at sql/schema.sql.
+-- raceId = year * 100 + round (e.g. 201501 for round 1 of 2015).
+
+CREATE TABLE IF NOT EXISTS races (
+    raceId  INTEGER PRIMARY KEY,
+    year    INTEGER NOT NULL,
+    round   INTEGER NOT NULL,
+    name    TEXT,
+    circuit TEXT,
+    date    TEXT
+);
+
+CREATE TABLE IF NOT EXISTS drivers (
+    driverId    TEXT PRIMARY KEY,
+    code        TEXT,
+    forename    TEXT,
+    surname     TEXT,
+    nationality TEXT
+);
+
+CREATE TABLE IF NOT EXISTS constructors (
+    constructorId TEXT PRIMARY KEY,
+    name          TEXT,
+    nationality   TEXT
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    resultId      INTEGER PRIMARY KEY AUTOINCREMENT,
+    raceId        INTEGER NOT NULL REFERENCES races (raceId),
+    driverId      TEXT NOT NULL REFERENCES drivers (driverId),
+    constructorId TEXT REFERENCES constructors (constructorId),
+    grid          INTEGER,
+    position      INTEGER,
+    points        REAL,
+    status        TEXT,
+    UNIQUE (raceId, driverId)       -- upsert key: reloading a season replaces its results
+);
+
+-- files created before the UNIQUE key existed (CREATE TABLE IF NOT EXISTS skips them)
+CREATE UNIQUE INDEX IF NOT EXISTS results_race_driver ON results (raceId, driverId);
+
+-- fetch_data.py --laps; same columns as data/lap_times.csv
+CREATE TABLE IF NOT EXISTS lap_times (
+    race_id      INTEGER NOT NULL,
+    driver_id    TEXT NOT NULL,
+    lap_number   INTEGER NOT NULL,
+    position     INTEGER,
+    lap_time     TEXT,
+    milliseconds INTEGER,
+    PRIMARY KEY (race_id, driver_id, lap_number)
+);
+
+CREATE TABLE IF NOT EXISTS pit_stops (
+    race_id      INTEGER NOT NULL,
+    driver_id    TEXT NOT NULL,
+    stop         INTEGER NOT NULL,
+    lap          INTEGER,
+    time         TEXT,
+    duration     TEXT,
+    milliseconds INTEGER,
+    PRIMARY KEY (race_id, driver_id, stop)
+);
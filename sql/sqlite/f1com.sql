@@ -0,0 +1,96 @@
+-- formula1.com scraper tables (races.py, results.py, starting_grid.py,
+-- fastest_laps.py, team_results.py, scrape_races.py, f1_results_scraper.py)
+-- for the local SQLite backend. Columns follow the cleaned DataFrames /
+-- upsert helpers of each script; primary keys are their conflict targets.
+
+CREATE TABLE IF NOT EXISTS races (
+    year        INTEGER NOT NULL,
+    grand_prix  TEXT NOT NULL,
+    date        TEXT,
+    first_name  TEXT,
+    last_name   TEXT,
+    driver_code TEXT,
+    team        TEXT,
+    laps        INTEGER,
+    time        TEXT,
+    race_link   TEXT,
+    PRIMARY KEY (year, grand_prix)
+);
+
+-- On RDS races_old is a frozen copy of races that results.py and
+-- starting_grid.py read their race links from; locally it is the same data.
+CREATE VIEW IF NOT EXISTS races_old AS SELECT * FROM races;
+
+CREATE TABLE IF NOT EXISTS results (
+    year        INTEGER NOT NULL,
+    grand_prix  TEXT NOT NULL,
+    pos         TEXT,
+    car_number  INTEGER NOT NULL,
+    first_name  TEXT,
+    last_name   TEXT,
+    team        TEXT,
+    laps        INTEGER,
+    time        TEXT,
+    points      REAL,
+    PRIMARY KEY (year, grand_prix, car_number)
+);
+
+CREATE TABLE IF NOT EXISTS starting_grid (
+    year              INTEGER NOT NULL,
+    grand_prix        TEXT NOT NULL,
+    pos               TEXT NOT NULL,
+    car_number        INTEGER,
+    driver_first_name TEXT,
+    driver_last_name  TEXT,
+    team              TEXT,
+    time              TEXT,
+    PRIMARY KEY (year, grand_prix, pos)
+);
+
+CREATE TABLE IF NOT EXISTS fastest_laps (
+    year              INTEGER NOT NULL,
+    grand_prix        TEXT NOT NULL,
+    driver_first_name TEXT,
+    driver_last_name  TEXT,
+    team              TEXT,
+    time              TEXT,
+    PRIMARY KEY (year, grand_prix)
+);
+
+CREATE TABLE IF NOT EXISTS team_standings (
+    year   INTEGER NOT NULL,
+    pos    INTEGER,
+    team   TEXT NOT NULL,
+    points REAL,
+    PRIMARY KEY (year, team)
+);
+
+CREATE TABLE IF NOT EXISTS legacy_races (
+    year       INTEGER NOT NULL,
+    round      INTEGER NOT NULL,
+    grand_prix TEXT,
+    country    TEXT,
+    date       TEXT,
+    result_url TEXT,
+    PRIMARY KEY (year, round)
+);
+
+CREATE TABLE IF NOT EXISTS legacy_results (
+    year        INTEGER NOT NULL,
+    round       INTEGER NOT NULL,
+    position    INTEGER NOT NULL,
+    driver_name TEXT,
+    driver_code TEXT,
+    constructor TEXT,
+    points      REAL,
+    status      TEXT,
+    time_text   TEXT,
+    laps        INTEGER,
+    PRIMARY KEY (year, round, position)
+);
+
+CREATE TABLE IF NOT EXISTS page_fingerprints (
+    url        TEXT PRIMARY KEY,
+    sha256     TEXT NOT NULL,
+    written_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
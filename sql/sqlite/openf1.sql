@@ -0,0 +1,101 @@
+-- OpenF1 tables (openf1-loader.py, openf1-backfill.py, openf1_telemetry.py)
+-- for the local SQLite backend; mirrors the Postgres tables and the runtime
+-- DDL in openf1_schema.py / openf1_telemetry.py / openf1-backfill.py.
+
+CREATE TABLE IF NOT EXISTS races (
+    session_key   INTEGER PRIMARY KEY,
+    meeting_key   INTEGER,
+    year          INTEGER,
+    country_name  TEXT,
+    event_name    TEXT,
+    circuit_short TEXT,
+    date_start    TEXT,
+    date_end      TEXT
+);
+
+CREATE TABLE IF NOT EXISTS drivers (
+    driver_number INTEGER PRIMARY KEY,
+    first_name    TEXT,
+    last_name     TEXT,
+    driver_code   TEXT,
+    team          TEXT
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    session_key   INTEGER NOT NULL,
+    driver_number INTEGER NOT NULL,
+    position      INTEGER,
+    points        REAL,
+    status        TEXT,
+    team_name     TEXT,
+    PRIMARY KEY (session_key, driver_number)
+);
+
+CREATE TABLE IF NOT EXISTS lap_times (
+    session_key   INTEGER NOT NULL,
+    driver_number INTEGER NOT NULL,
+    lap_number    INTEGER NOT NULL,
+    lap_time_ms   REAL,
+    sector1_ms    REAL,
+    sector2_ms    REAL,
+    sector3_ms    REAL,
+    position      INTEGER,
+    PRIMARY KEY (session_key, driver_number, lap_number)
+);
+
+CREATE TABLE IF NOT EXISTS stints (
+    session_key       INTEGER NOT NULL,
+    driver_number     INTEGER NOT NULL,
+    stint_number      INTEGER NOT NULL,
+    lap_start         INTEGER,
+    lap_end           INTEGER,
+    compound          TEXT,
+    tyre_age_at_start INTEGER,
+    PRIMARY KEY (session_key, driver_number, stint_number)
+);
+CREATE INDEX IF NOT EXISTS stints_session_driver_laps
+    ON stints (session_key, driver_number, lap_start, lap_end, compound, tyre_age_at_start);
+
+CREATE TABLE IF NOT EXISTS pit_stops (
+    session_key   INTEGER NOT NULL,
+    driver_number INTEGER NOT NULL,
+    lap_number    INTEGER NOT NULL,
+    pit_duration  REAL,
+    date          TEXT,
+    PRIMARY KEY (session_key, driver_number, lap_number)
+);
+
+CREATE TABLE IF NOT EXISTS load_watermarks (
+    session_key      INTEGER PRIMARY KEY,
+    drivers_rows     INTEGER NOT NULL DEFAULT 0,
+    results_rows     INTEGER NOT NULL DEFAULT 0,
+    laps_rows        INTEGER NOT NULL DEFAULT 0,
+    loaded_at        TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    session_finished INTEGER NOT NULL DEFAULT 0,
+    telemetry_rows   INTEGER,
+    stints_rows      INTEGER,
+    pit_rows         INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS car_data (
+    session_key   INTEGER NOT NULL,
+    driver_number INTEGER NOT NULL,
+    date          TEXT NOT NULL,
+    rpm           INTEGER,
+    speed         INTEGER,
+    n_gear        INTEGER,
+    throttle      INTEGER,
+    brake         INTEGER,
+    drs           INTEGER
+);
+CREATE INDEX IF NOT EXISTS car_data_session_driver_date ON car_data (session_key, driver_number, date);
+
+CREATE TABLE IF NOT EXISTS car_location (
+    session_key   INTEGER NOT NULL,
+    driver_number INTEGER NOT NULL,
+    date          TEXT NOT NULL,
+    x             INTEGER,
+    y             INTEGER,
+    z             INTEGER
+);
+CREATE INDEX IF NOT EXISTS car_location_session_driver_date ON car_location (session_key, driver_number, date);